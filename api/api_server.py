@@ -1,21 +1,233 @@
+import asyncio
+import base64
 import json
 import logging
 import threading
-from flask import Flask, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+import orjson
+import uvicorn
+from quart import Quart, Response, request
 from environment.android_env import AndroidEnvironment
 from utils.logging import setup_logger
 from .coordinator import Coordinator
 
 logger = setup_logger()
 
+# msgpack 是可选依赖：客户端通过 Accept: application/msgpack 协商二进制响应，截图 bytes 无需 base64
+try:
+    import msgpack
+except Exception as import_err:
+    logger.debug(f"未安装 msgpack，仅支持 JSON 响应: {import_err}")
+    msgpack = None
+
+_MSGPACK_MIMETYPE = 'application/msgpack'
+
+# msgspec 是可选依赖：有它时请求体在原生代码里一次完成解析 + 字段校验
+try:
+    import msgspec
+except Exception as import_err:
+    logger.debug(f"未安装 msgspec，请求体校验退回 orjson + Python 检查: {import_err}")
+    msgspec = None
+
+# uvloop / httptools 是可选加速依赖（仅 Linux/macOS 有 wheel），缺失时回退到 asyncio + h11
+try:
+    import uvloop  # noqa: F401
+    _UVICORN_LOOP = 'uvloop'
+except Exception as import_err:
+    logger.debug(f"未安装 uvloop，使用默认 asyncio 事件循环: {import_err}")
+    _UVICORN_LOOP = 'asyncio'
+
+try:
+    import httptools  # noqa: F401
+    _UVICORN_HTTP = 'httptools'
+except Exception as import_err:
+    logger.debug(f"未安装 httptools，使用 h11 解析 HTTP: {import_err}")
+    _UVICORN_HTTP = 'h11'
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+# 请求体上限：trajectory_data 可能有数 MB，但超过这个量级直接拒绝
+_MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# Worker 类型 -> 未注册时返回给客户端的错误信息
+_WORKER_NOT_FOUND = {
+    'EnvironmentWorker': '未找到环境 Worker',
+    'RewardWorker': 'RewardWorker not found',
+}
+
+
+class _RequestError(Exception):
+    """请求体不合法时抛出，由统一的 error handler 转换为 JSON 错误响应"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _orjson_default(obj):
+    """orjson 无法原生序列化的类型（如截图 bytes）在这里兜底"""
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(obj).decode('ascii')
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _json(payload, status=200):
+    """用 orjson 编码响应体，替代 jsonify（后者走纯 Python 的 json.dumps）"""
+    return Response(
+        orjson.dumps(payload, default=_orjson_default, option=_ORJSON_OPTIONS),
+        status=status,
+        mimetype='application/json'
+    )
+
+
+def _msgpack_default(obj):
+    """msgpack 无法原生序列化的类型：numpy 数组/标量转成 Python 对象，集合转成列表"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Type is not msgpack serializable: {type(obj).__name__}")
+
+
+def _wants_msgpack():
+    """Accept 头中 msgpack 的权重高于 JSON 时返回 True"""
+    if msgpack is None:
+        return False
+    accept = request.accept_mimetypes
+    return accept.quality(_MSGPACK_MIMETYPE) > accept.quality('application/json')
+
+
+def _negotiated(payload, status=200):
+    """按 Accept 头选择 msgpack 或 JSON 编码，默认 JSON"""
+    if _wants_msgpack():
+        return Response(
+            msgpack.packb(payload, use_bin_type=True, default=_msgpack_default),
+            status=status,
+            mimetype=_MSGPACK_MIMETYPE
+        )
+    return _json(payload, status)
+
+
+async def _read_json():
+    """用 orjson 直接从原始字节解析请求体，省去 request.json 的 str 解码和 json.loads"""
+    if request.content_length is not None and request.content_length > _MAX_BODY_BYTES:
+        raise _RequestError(f'请求体过大（{request.content_length} bytes）', 413)
+    body = await request.get_data(cache=False)
+    if not body:
+        return {}
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as exc:
+        raise _RequestError(f'请求体不是合法 JSON: {exc}')
+    if not isinstance(data, dict):
+        raise _RequestError('请求体必须是 JSON 对象')
+    return data
+
+
+# ----------------------------------------------------------------------
+# 请求体 schema
+# ----------------------------------------------------------------------
+if msgspec is not None:
+    _Schema = msgspec.Struct
+else:
+    class _Schema:
+        """msgspec 缺失时的简易替身：按类注解检查必填字段和基本类型，未知字段忽略"""
+
+        def __init__(self, **fields):
+            for name, annotation in self.__annotations__.items():
+                if name in fields:
+                    value = fields[name]
+                elif hasattr(type(self), name):
+                    value = getattr(type(self), name)
+                else:
+                    raise _RequestError(f'Object missing required field `{name}`')
+                if annotation is not Any and not isinstance(value, annotation):
+                    raise _RequestError(
+                        f'Expected `{annotation.__name__}`, got `{type(value).__name__}` - at `$.{name}`'
+                    )
+                setattr(self, name, value)
+
+
+class TrajectoryRequest(_Schema):
+    trajectory_id: str
+
+
+class StepRequest(_Schema):
+    trajectory_id: str
+    command: Any = None
+    action: Any = None  # command 的别名
+    inline_image: bool = True
+
+
+class CreateBatchRequest(_Schema):
+    n: int
+
+
+class RemoveBatchRequest(_Schema):
+    trajectory_ids: list
+
+
+class RewardRequest(_Schema):
+    reward_type: str
+    trajectory_id: str
+    trajectory_data: Any
+
+
+_DECODERS = {}
+if msgspec is not None:
+    _DECODERS = {
+        schema: msgspec.json.Decoder(schema)
+        for schema in (TrajectoryRequest, StepRequest, CreateBatchRequest, RemoveBatchRequest, RewardRequest)
+    }
+
+
+async def _read_request(schema):
+    """把请求体解析并校验为 schema 实例；缺字段 / 类型不符时抛 _RequestError（400）"""
+    decoder = _DECODERS.get(schema)
+    if decoder is None:
+        return schema(**await _read_json())
+    if request.content_length is not None and request.content_length > _MAX_BODY_BYTES:
+        raise _RequestError(f'请求体过大（{request.content_length} bytes）', 413)
+    try:
+        return decoder.decode(await request.get_data(cache=False))
+    except msgspec.ValidationError as exc:
+        raise _RequestError(str(exc))
+    except msgspec.DecodeError as exc:
+        raise _RequestError(f'请求体不是合法 JSON: {exc}')
+
+
+def _step_command(data):
+    """取出 step 的动作：优先 "command"，"action" 作为别名"""
+    command = data.get('command') if 'command' in data else None
+    if command is None:
+        command = data.get('action')  # allow alias
+    return command
+
+
 class ApiServer:
     """HTTP API 服务器，提供与 Coordinator 和 Worker 交互的接口"""
     
     def __init__(self, coordinator, host='localhost', port=5000):
-        self.app = Flask(__name__)
+        self.app = Quart(__name__)
+        self.app.config['MAX_CONTENT_LENGTH'] = _MAX_BODY_BYTES
+        self.app.register_error_handler(_RequestError, self._handle_request_error)
         self.coordinator = coordinator
         self.host = host
         self.port = port
+        self.server = None
+        # 常量响应在初始化时编码一次；coordinator 状态按 (running, worker 快照) 缓存
+        self._actions_response = self._build_actions_response()
+        self._status_cache = (None, None, b'')
+        # 阻塞的 Worker 调用不走 asyncio 默认线程池：同一 trajectory（即同一台设备）的请求
+        # 进入各自的单线程 executor 串行执行，不同设备之间并发；create / reward 等走共享线程池
+        self._shared_executor = ThreadPoolExecutor(
+            max_workers=coordinator.config.get('api_max_threads', 32),
+            thread_name_prefix='api-shared'
+        )
+        self._trajectory_executors = {}  # trajectory_id -> ThreadPoolExecutor(max_workers=1)
         self.setup_routes()
         logger.info(f"API Server 初始化在 {host}:{port}")
     
@@ -34,10 +246,14 @@ class ApiServer:
         
         # 环境相关接口
         self.app.route('/api/env/create', methods=['POST'])(self.create_env)
+        self.app.route('/api/env/create_batch', methods=['POST'])(self.create_env_batch)
         self.app.route('/api/env/save', methods=['POST'])(self.save_env)
         self.app.route('/api/env/load', methods=['POST'])(self.load_env)
         self.app.route('/api/env/step', methods=['POST'])(self.step_env)
+        self.app.route('/api/env/step_batch', methods=['POST'])(self.step_env_batch)
         self.app.route('/api/env/remove', methods=['POST'])(self.remove_env)
+        self.app.route('/api/env/remove_batch', methods=['POST'])(self.remove_env_batch)
+        self.app.route('/api/env/screenshot/<trajectory_id>')(self.get_env_screenshot)
 
         # 列出支持的动作类型（便于前端构建动态表单）
         self.app.route('/api/env/actions')(self.list_env_actions)
@@ -46,212 +262,309 @@ class ApiServer:
         self.app.route('/api/reward/calculate', methods=['POST'])(self.calculate_reward)
 
     def start(self):
-        """启动 API 服务器"""
-        threading.Thread(
-            target=self.app.run,
-            kwargs={
-                'host': self.host,
-                'port': self.port,
-                'debug': False,
-                'use_reloader': False
-            }
-        ).start()
-        logger.info(f"API Server 开始运行在 {self.host}:{self.port}")
+        """启动 API 服务器（uvicorn 驱动的 ASGI 事件循环，运行在后台线程中）"""
+        config = uvicorn.Config(
+            self.app,
+            host=self.host,
+            port=self.port,
+            loop=_UVICORN_LOOP,
+            http=_UVICORN_HTTP,
+            workers=1,
+            log_level='info'
+        )
+        self.server = uvicorn.Server(config)
+        threading.Thread(target=self.server.run, name='api-server').start()
+        logger.info(f"API Server 开始运行在 {self.host}:{self.port} (loop={_UVICORN_LOOP}, http={_UVICORN_HTTP})")
+
+    def stop(self):
+        """通知 uvicorn 优雅退出，并关闭 Worker 调用线程池"""
+        if self.server is not None:
+            self.server.should_exit = True
+        for trajectory_id in list(self._trajectory_executors):
+            self._release_executor(trajectory_id)
+        self._shared_executor.shutdown(wait=False)
+
+    async def _handle_request_error(self, error):
+        return _json({'success': False, 'error': error.message}, error.status)
 
     # Coordinator 接口实现
-    def get_coordinator_status(self):
-        return jsonify({
-            'status': 'running' if self.coordinator.running else 'stopped',
-            'id': self.coordinator.id,
-            'worker_count': len(self.coordinator.workers)
-        })
+    async def get_coordinator_status(self):
+        running = self.coordinator.running
+        snapshot = self.coordinator.worker_snapshot()
+        cached_running, cached_snapshot, body = self._status_cache
+        # 快照元组只在注册/注销时重建，用 is 比较即可判断是否失效
+        if cached_running is not running or cached_snapshot is not snapshot:
+            body = orjson.dumps({
+                'status': 'running' if running else 'stopped',
+                'id': self.coordinator.id,
+                'worker_count': len(snapshot)
+            })
+            self._status_cache = (running, snapshot, body)
+        return Response(body, mimetype='application/json')
     
-    def list_workers(self):
-        return jsonify({
-            'workers': [
-                {
-                    'id': worker_id,
-                    'type': status['type'],
-                    'status': status['status'],
-                    'last_heartbeat': status['last_heartbeat']
-                }
-                for worker_id, status in self.coordinator.worker_status.items()
-            ]
-        })
+    async def list_workers(self):
+        workers = []
+        for worker_id, status in self.coordinator.status_snapshot().items():
+            workers.append({
+                'id': worker_id,
+                'type': status['type'],
+                'status': status['status'],
+                'last_heartbeat': status['last_heartbeat']
+            })
+        return _json({'workers': workers})
     
     # Worker 接口实现
-    def start_worker(self, worker_id):
-        success = self.coordinator.start_worker(worker_id)
-        return jsonify({'success': success})
+    async def start_worker(self, worker_id):
+        success = await asyncio.to_thread(self.coordinator.start_worker, worker_id)
+        return _json({'success': success})
     
-    def stop_worker(self, worker_id):
-        success = self.coordinator.stop_worker(worker_id)
-        return jsonify({'success': success})
+    async def stop_worker(self, worker_id):
+        success = await asyncio.to_thread(self.coordinator.stop_worker, worker_id)
+        return _json({'success': success})
     
-    def restart_worker(self, worker_id):
-        success = self.coordinator.restart_worker(worker_id)
-        return jsonify({'success': success})
+    async def restart_worker(self, worker_id):
+        success = await asyncio.to_thread(self.coordinator.restart_worker, worker_id)
+        return _json({'success': success})
     
-    def update_worker_config(self, worker_id):
-        config = request.json
-        success = self.coordinator.update_worker_config(worker_id, config)
-        return jsonify({'success': success})
+    async def update_worker_config(self, worker_id):
+        config = await _read_json()
+        success = await asyncio.to_thread(self.coordinator.update_worker_config, worker_id, config)
+        return _json({'success': success})
     
-    def get_worker_status(self, worker_id):
+    async def get_worker_status(self, worker_id):
         status = self.coordinator.check_worker_status(worker_id)
         if status:
-            return jsonify(status)
-        return jsonify({'error': 'Worker not found'}), 404
-    
-    # 环境接口实现
-    def create_env(self):
-        # 找到环境 worker
-        env_worker = None
-        for worker_id, worker in self.coordinator.workers.items():
-            if self.coordinator.worker_status[worker_id]['type'] == 'EnvironmentWorker':
-                env_worker = worker
-                break
-        
-        if not env_worker:
-            return jsonify({'success': False, 'error': '未找到环境 Worker'}), 404
-        
-        result = env_worker.handle_request({'action': 'create'})
-        return jsonify(result)
+            return _json(status)
+        return _json({'error': 'Worker not found'}, 404)
     
-    def save_env(self):
-        data = request.json
-        trajectory_id = data.get('trajectory_id')
-        
+    @staticmethod
+    def _is_live(worker, trajectory_id):
+        """trajectory 是否由 Worker 的 create / load 登记且尚未 remove / 闲置清理"""
+        return trajectory_id in getattr(worker, 'active_trajectories', ())
+
+    def _executor_for(self, worker, trajectory_id):
+        """返回 trajectory 专属的单线程 executor
+
+        只为 Worker 登记过的 trajectory 分配；没有 trajectory_id 或 id 未知（拼错、已移除）时
+        返回共享线程池，避免任意 id 的请求各自留下一个线程。只在事件循环线程中调用，无需加锁。
+        """
         if not trajectory_id:
-            return jsonify({'success': False, 'error': '缺少 trajectory_id'}), 400
-        
-        env_worker = None
-        for worker_id, worker in self.coordinator.workers.items():
-            if self.coordinator.worker_status[worker_id]['type'] == 'EnvironmentWorker':
-                env_worker = worker
-                break
-        
-        if not env_worker:
-            return jsonify({'success': False, 'error': '未找到环境 Worker'}), 404
-        
-        result = env_worker.handle_request({
-            'action': 'save',
-            'trajectory_id': trajectory_id
+            return self._shared_executor
+        executor = self._trajectory_executors.get(trajectory_id)
+        if executor is None:
+            if not self._is_live(worker, trajectory_id):
+                return self._shared_executor
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'env-{str(trajectory_id)[:8]}')
+            self._trajectory_executors[trajectory_id] = executor
+        return executor
+
+    def _release_stale_executor(self, worker, trajectory_id):
+        """Worker 已不再持有该 trajectory（remove 成功、闲置清理、本就未知）时释放其 executor"""
+        if trajectory_id in self._trajectory_executors and not self._is_live(worker, trajectory_id):
+            self._release_executor(trajectory_id)
+
+    def _release_executor(self, trajectory_id):
+        executor = self._trajectory_executors.pop(trajectory_id, None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    async def _run_blocking(self, executor, func, *args):
+        """在指定 executor 中执行阻塞调用（adb / 子进程），避免卡住事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    async def _call_worker(self, worker, payload):
+        """按 payload 中的 trajectory_id 选择 executor 执行 handle_request"""
+        trajectory_id = payload.get('trajectory_id')
+        result = await self._run_blocking(self._executor_for(worker, trajectory_id), worker.handle_request, payload)
+        for stale_id in ([trajectory_id] if trajectory_id else payload.get('trajectory_ids') or []):
+            if isinstance(stale_id, str):
+                self._release_stale_executor(worker, stale_id)
+        return result
+
+    async def _dispatch(self, worker_type, payload):
+        """按类型找到 Worker 并转发请求，所有 env / reward 接口共用这一条路径"""
+        worker = self.coordinator.get_worker_by_type(worker_type)
+        if not worker:
+            return _json({'success': False, 'error': _WORKER_NOT_FOUND[worker_type]}, 404)
+        if worker_type == 'EnvironmentWorker':
+            result = await self._call_worker(worker, payload)
+        else:
+            result = await self._run_blocking(self._shared_executor, worker.handle_request, payload)
+        return _negotiated(result)
+
+    async def _dispatch_trajectory(self, action):
+        """save / load / remove 只需要 trajectory_id，统一在这里校验并转发"""
+        req = await _read_request(TrajectoryRequest)
+        if not req.trajectory_id:
+            return _json({'success': False, 'error': '缺少 trajectory_id'}, 400)
+        return await self._dispatch('EnvironmentWorker', {
+            'action': action,
+            'trajectory_id': req.trajectory_id
         })
-        return jsonify(result)
+
+    # 环境接口实现
+    async def create_env(self):
+        return await self._dispatch('EnvironmentWorker', {'action': 'create'})
+
+    async def create_env_batch(self):
+        """一次请求并发创建 n 个环境：{"n": 4}，返回 {"success", "results": [...]}"""
+        req = await _read_request(CreateBatchRequest)
+        return await self._dispatch('EnvironmentWorker', {'action': 'create_batch', 'n': req.n})
     
-    def load_env(self):
-        data = request.json
-        trajectory_id = data.get('trajectory_id')
-        
-        if not trajectory_id:
-            return jsonify({'success': False, 'error': '缺少 trajectory_id'}), 400
-        
-        env_worker = None
-        for worker_id, worker in self.coordinator.workers.items():
-            if self.coordinator.worker_status[worker_id]['type'] == 'EnvironmentWorker':
-                env_worker = worker
-                break
-        
-        if not env_worker:
-            return jsonify({'success': False, 'error': '未找到环境 Worker'}), 404
-        
-        result = env_worker.handle_request({
-            'action': 'load',
-            'trajectory_id': trajectory_id
-        })
-        return jsonify(result)
+    async def save_env(self):
+        return await self._dispatch_trajectory('save')
+    
+    async def load_env(self):
+        return await self._dispatch_trajectory('load')
     
-    def step_env(self):
-        data = request.json or {}
-        trajectory_id = data.get('trajectory_id')
+    async def step_env(self):
+        req = await _read_request(StepRequest)
 
         # 支持多种动作表示：
         # 1) legacy "command" 字符串，如 "click 100 200"
         # 2) "command" dict / JSON，直接映射 android_world.env.json_action.JSONAction
         # 3) 新增 "action" 字段，效果同 "command"，便于前端语义化调用
-        command = data.get('command') if 'command' in data else None
-        if command is None:
-            command = data.get('action')  # allow alias
-        print('Cur action is:', command)
+        command = req.command if req.command is not None else req.action
+        logger.debug('cur action=%r', command)
 
         # null/empty guard
-        if trajectory_id is None or command is None:
-            return jsonify({'success': False, 'error': '缺少 trajectory_id 或 action/command'}), 400
-        
-        env_worker = None
-        for worker_id, worker in self.coordinator.workers.items():
-            if self.coordinator.worker_status[worker_id]['type'] == 'EnvironmentWorker':
-                env_worker = worker
-                break
-        
-        if not env_worker:
-            return jsonify({'success': False, 'error': '未找到环境 Worker'}), 404
+        if command is None:
+            return _json({'success': False, 'error': '缺少 trajectory_id 或 action/command'}, 400)
         
         # 直接把 command 原样传递，底层 Environment 会自行解析（DSL 或 JSONAction）。
-        result = env_worker.handle_request({
+        # inline_image=false 时截图不随 JSON 返回，客户端按 screenshot_etag 到截图接口取原始 PNG
+        return await self._dispatch('EnvironmentWorker', {
             'action': 'step',
-            'trajectory_id': trajectory_id,
-            'command': command
+            'trajectory_id': req.trajectory_id,
+            'command': command,
+            'inline_image': req.inline_image
         })
-        return jsonify(result)
     
-    def remove_env(self):
-        data = request.json
-        trajectory_id = data.get('trajectory_id')
-        
-        if not trajectory_id:
-            return jsonify({'success': False, 'error': '缺少 trajectory_id'}), 400
-        
-        env_worker = None
-        for worker_id, worker in self.coordinator.workers.items():
-            if self.coordinator.worker_status[worker_id]['type'] == 'EnvironmentWorker':
-                env_worker = worker
-                break
-        
-        if not env_worker:
-            return jsonify({'success': False, 'error': '未找到环境 Worker'}), 404
-        
-        result = env_worker.handle_request({
-            'action': 'remove',
-            'trajectory_id': trajectory_id
+    async def step_env_batch(self):
+        """一次请求执行多个 step：{"steps": [{"trajectory_id": ..., "command"/"action": ...}, ...]}
+
+        整批只做一次 JSON 解析和一次 Worker 查找；按 trajectory 分组后，每组在该设备的
+        executor 上交给 Worker 的 step_sequence 合并执行，不同设备并发执行，结果按输入顺序返回。
+        """
+        data = await _read_json()
+        steps = data.get('steps')
+        if not isinstance(steps, list) or not steps:
+            return _json({'success': False, 'error': '缺少 steps 列表'}, 400)
+
+        worker = self.coordinator.get_worker_by_type('EnvironmentWorker')
+        if not worker:
+            return _json({'success': False, 'error': _WORKER_NOT_FOUND['EnvironmentWorker']}, 404)
+
+        groups = {}  # trajectory_id -> [(原始下标, 请求)]
+        for index, item in enumerate(steps):
+            if not isinstance(item, dict):
+                groups.setdefault(None, []).append((index, None))  # 交给 Worker 返回逐条错误
+                continue
+            trajectory_id = item.get('trajectory_id')
+            key = trajectory_id if isinstance(trajectory_id, str) else None
+            groups.setdefault(key, []).append((index, {
+                'action': 'step',
+                'trajectory_id': trajectory_id,
+                'command': _step_command(item),
+                'inline_image': item.get('inline_image', True)
+            }))
+
+        group_items = list(groups.items())
+        group_results = await asyncio.gather(*(
+            self._run_blocking(
+                self._executor_for(worker, trajectory_id),
+                worker.handle_batch_request,
+                [req for _, req in items]
+            )
+            for trajectory_id, items in group_items
+        ))
+        for trajectory_id, _ in group_items:
+            if trajectory_id:
+                self._release_stale_executor(worker, trajectory_id)
+        results = [None] * len(steps)
+        for (_, items), batch in zip(group_items, group_results):
+            for (index, _), result in zip(items, batch):
+                results[index] = result
+        return _negotiated({
+            'success': all(r.get('success', False) for r in results),
+            'results': results
         })
-        return jsonify(result)
+
+    async def remove_env(self):
+        return await self._dispatch_trajectory('remove')
+
+    async def remove_env_batch(self):
+        """一次请求并发删除多个环境：{"trajectory_ids": [...]}，results 与输入顺序一致"""
+        req = await _read_request(RemoveBatchRequest)
+        return await self._dispatch('EnvironmentWorker', {
+            'action': 'remove_batch',
+            'trajectory_ids': req.trajectory_ids
+        })
+
+    async def get_env_screenshot(self, trajectory_id):
+        """以 image/png 直接返回截图字节，支持 If-None-Match / Range
+
+        ?cached=1 时返回最近一次 step 截图的缓存，不再访问设备。未知 trajectory 返回 404，
+        截图失败返回 502。
+        """
+        worker = self.coordinator.get_worker_by_type('EnvironmentWorker')
+        if not worker:
+            return _json({'success': False, 'error': _WORKER_NOT_FOUND['EnvironmentWorker']}, 404)
+        result = await self._call_worker(worker, {
+            'action': 'screenshot',
+            'trajectory_id': trajectory_id,
+            'cached': request.args.get('cached', '0') not in ('0', 'false', '')
+        })
+        if not result.get('success'):
+            # 只有 trajectory 不存在时返回 404；设备存在但截图失败（adb / screencap 出错）属于上游错误
+            return _json(result, 404 if result.get('not_found') else 502)
+
+        response = Response(result['image'], mimetype='image/png')
+        response.set_etag(result['etag'])
+        response.headers['Cache-Control'] = 'no-cache'  # 内容随设备变化，每次都需用 ETag 校验
+        # complete_length 必须给出，否则 Quart 不处理 Range，总是返回 200 和完整内容
+        await response.make_conditional(request, accept_ranges=True, complete_length=len(result['image']))
+        return response
 
     # Reward interface implementation
-    def calculate_reward(self):
-        data = request.json
-        reward_type = data.get('reward_type')
-        trajectory_id = data.get('trajectory_id')
-        trajectory_data = data.get('trajectory_data')
+    async def calculate_reward(self):
+        req = await _read_request(RewardRequest)
+        reward_type = req.reward_type
+        trajectory_id = req.trajectory_id
+        trajectory_data = req.trajectory_data
 
         if not reward_type or not trajectory_id or not trajectory_data:
-            return jsonify({'success': False, 'error': 'Missing reward_type, trajectory_id, or trajectory_data'}), 400
-
-        # Find reward worker
-        reward_worker = None
-        for worker_id, worker_obj in self.coordinator.workers.items():
-            if self.coordinator.worker_status[worker_id]['type'] == 'RewardWorker':
-                reward_worker = worker_obj
-                break
-        
-        if not reward_worker:
-            return jsonify({'success': False, 'error': 'RewardWorker not found'}), 404
+            return _json({'success': False, 'error': 'Missing reward_type, trajectory_id, or trajectory_data'}, 400)
 
-        result = reward_worker.handle_request({
+        worker = self.coordinator.get_worker_by_type('RewardWorker')
+        if not worker:
+            return _json({'success': False, 'error': _WORKER_NOT_FOUND['RewardWorker']}, 404)
+        result = await self._run_blocking(self._shared_executor, worker.handle_request, {
             'action': 'calculate_reward',
             'reward_type': reward_type,
             'trajectory_id': trajectory_id,
             'trajectory_data': trajectory_data
         })
-        return jsonify(result)
+        del req, trajectory_data  # 轨迹可能很大，编码响应前先释放请求体
+        return _negotiated(result)
 
-    def list_env_actions(self):
-        """返回后端当前支持的 JSONAction 类型列表。"""
+    @staticmethod
+    def _build_actions_response():
+        """导入 json_action 并编码动作列表，返回 (body, status)；只在初始化时调用一次"""
         try:
             from android_world.env import json_action as ja  # type: ignore
             actions = list(getattr(ja, '_ACTION_TYPES', []))
-            return jsonify({'success': True, 'actions': actions})
+            return orjson.dumps({'success': True, 'actions': actions}), 200
         except Exception as exc:  # pragma: no cover
             logger.warning(f'Failed to fetch action list: {exc}')
-            return jsonify({'success': False, 'error': str(exc)}), 500
+            return orjson.dumps({'success': False, 'error': str(exc)}), 500
+
+    async def list_env_actions(self):
+        """返回后端当前支持的 JSONAction 类型列表。"""
+        body, status = self._actions_response
+        return Response(body, status=status, mimetype='application/json')
+
+
+def create_app(coordinator):
+    """返回挂好路由的 ASGI 应用，不启动内嵌服务器（供 uvicorn / gunicorn 直接加载）"""
+    return ApiServer(coordinator).app
@@ -1,7 +1,10 @@
 import time
-import uuid
+import os
+import heapq
 import threading
-from typing import Dict, List, Any, Optional
+from collections import defaultdict
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Tuple
 from utils.logging import setup_logger
 
 logger = setup_logger()
@@ -15,20 +18,37 @@ class Coordinator:
         self.config = config
         self.workers = {}  # worker_id -> worker
         self.worker_status = {}  # worker_id -> status
+        self.workers_by_type: Dict[str, List[Any]] = defaultdict(list)  # 类型名 -> [worker]，按注册顺序
         self.worker_lock = threading.Lock()
+        # 写时复制的 (worker_id, worker) 快照：只在注册/注销时于锁内重建，读者无需加锁
+        self._workers_snapshot: tuple = ()
+        # 只读的状态快照 worker_id -> 状态，每次在锁内修改 worker_status 后整体替换；状态查询读它，不加锁
+        self._status_snapshot = MappingProxyType({})
+        # 心跳调度：条件变量与 worker_lock 共用同一把锁；_deadlines 是 (下次检查时间, worker_id) 小顶堆，
+        # _next_check 记录每个 worker 当前有效的截止时间，用于惰性丢弃堆中过期条目
+        self._cond = threading.Condition(self.worker_lock)
+        self._deadlines: List[Tuple[float, str]] = []
+        self._next_check: Dict[str, float] = {}
+        self.heartbeat_interval = config.get('heartbeat_interval', 10)
+        self.heartbeat_timeout = config.get('heartbeat_timeout', 60)
         self.running = False
         self.monitor_thread = None
-        self.id = str(uuid.uuid4())
+        self.id = os.urandom(16).hex()
         logger.info(f"Coordinator initialized with ID {self.id}")
     
-    def start(self):
-        """启动协调器"""
+    def start(self, block: bool = True):
+        """启动协调器
+
+        block=False 时只启动监控线程后立即返回（由 ASGI 服务器托管进程生命周期时使用）。
+        """
         logger.info("Starting coordinator...")
         self.running = True
         self.monitor_thread = threading.Thread(target=self._monitor_workers)
         self.monitor_thread.daemon = True
         self.monitor_thread.start()
         # 在实际应用中，这里可能会启动一个 HTTP 服务器或其他 RPC 接口
+        if not block:
+            return
         
         try:
             while self.running:
@@ -40,25 +60,31 @@ class Coordinator:
         """停止协调器"""
         logger.info("Stopping coordinator...")
         self.running = False
+        with self._cond:
+            self._cond.notify_all()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
         
         # 停止所有 worker
-        for worker_id, worker in list(self.workers.items()):
+        for worker_id, worker in self._workers_snapshot:
             self.stop_worker(worker_id)
     
     def register_worker(self, worker) -> str:
         """注册一个新的 Worker"""
-        worker_id = worker.id if hasattr(worker, 'id') else str(uuid.uuid4())
+        worker_id = worker.id if hasattr(worker, 'id') else os.urandom(16).hex()
         
         with self.worker_lock:
             self.workers[worker_id] = worker
+            self.workers_by_type[worker.__class__.__name__].append(worker)
             self.worker_status[worker_id] = {
                 'status': 'idle',
                 'last_heartbeat': time.time(),
                 'resources': {},
                 'type': worker.__class__.__name__
             }
+            self._workers_snapshot = tuple(self.workers.items())
+            self._publish_status()
+            self._schedule_check(worker_id, time.time() + self.heartbeat_interval)
         
         logger.info(f"Registered worker {worker_id} of type {worker.__class__.__name__}")
         return worker_id
@@ -67,14 +93,43 @@ class Coordinator:
         """注销一个 Worker"""
         with self.worker_lock:
             if worker_id in self.workers:
-                del self.workers[worker_id]
-                del self.worker_status[worker_id]
+                worker = self.workers.pop(worker_id)
+                worker_type = self.worker_status.pop(worker_id)['type']
+                same_type = self.workers_by_type.get(worker_type, [])
+                if worker in same_type:
+                    same_type.remove(worker)
+                self._workers_snapshot = tuple(self.workers.items())
+                self._publish_status()
+                self._next_check.pop(worker_id, None)  # 堆里的条目在弹出时被丢弃
                 logger.info(f"Unregistered worker {worker_id}")
                 return True
             else:
                 logger.warning(f"Attempted to unregister non-existent worker {worker_id}")
                 return False
     
+    def worker_snapshot(self) -> tuple:
+        """返回当前 (worker_id, worker) 快照，供只读遍历，不需要持锁"""
+        return self._workers_snapshot
+    
+    def status_snapshot(self) -> MappingProxyType:
+        """返回只读的 worker_id -> 状态快照，不需要持锁"""
+        return self._status_snapshot
+    
+    def _publish_status(self):
+        """重建状态快照；调用方需持有 worker_lock"""
+        self._status_snapshot = MappingProxyType({
+            worker_id: MappingProxyType(dict(status))
+            for worker_id, status in self.worker_status.items()
+        })
+    
+    def get_worker_by_type(self, worker_type: str) -> Optional[Any]:
+        """按类型名（如 'EnvironmentWorker'）取第一个已注册的 Worker，O(1) 且不加锁"""
+        workers = self.workers_by_type.get(worker_type)
+        try:
+            return workers[0] if workers else None
+        except IndexError:  # 与 unregister 并发时列表可能刚被清空
+            return None
+    
     def start_worker(self, worker_id: str) -> bool:
         """启动一个 Worker"""
         with self.worker_lock:
@@ -83,6 +138,7 @@ class Coordinator:
                 if hasattr(worker, 'start') and callable(worker.start):
                     worker.start()
                     self.worker_status[worker_id]['status'] = 'running'
+                    self._publish_status()
                     logger.info(f"Started worker {worker_id}")
                     return True
             
@@ -97,6 +153,7 @@ class Coordinator:
                 if hasattr(worker, 'stop') and callable(worker.stop):
                     worker.stop()
                     self.worker_status[worker_id]['status'] = 'stopped'
+                    self._publish_status()
                     logger.info(f"Stopped worker {worker_id}")
                     return True
             
@@ -123,41 +180,94 @@ class Coordinator:
             return False
     
     def check_worker_status(self, worker_id: str) -> Optional[Dict[str, Any]]:
-        """检查 Worker 状态"""
-        with self.worker_lock:
-            if worker_id in self.worker_status:
-                return self.worker_status[worker_id]
-            return None
+        """检查 Worker 状态（读快照，不加锁）"""
+        status = self._status_snapshot.get(worker_id)
+        return dict(status) if status is not None else None
+    
+    def notify_heartbeat(self, worker_id: str, status: Dict[str, Any]) -> bool:
+        """记录一次心跳（Worker 可主动推送，监控线程探测到心跳时也走这里），并顺延下次检查时间"""
+        now = time.time()
+        with self._cond:
+            worker_status = self.worker_status.get(worker_id)
+            if worker_status is None:
+                return False
+            worker_status.update({
+                'last_heartbeat': now,
+                'resources': status.get('resources', {}),
+                'status': status.get('status', 'unknown')
+            })
+            self._publish_status()
+            self._schedule_check(worker_id, now + self.heartbeat_interval)
+        return True
+    
+    def _schedule_check(self, worker_id: str, deadline: float):
+        """调用方需持有 worker_lock"""
+        self._next_check[worker_id] = deadline
+        heapq.heappush(self._deadlines, (deadline, worker_id))
+        self._cond.notify()
+    
+    def _pop_due_workers(self, now: float) -> List[Tuple[str, Any]]:
+        """弹出所有已到期的 worker；调用方需持有 worker_lock"""
+        due = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, worker_id = heapq.heappop(self._deadlines)
+            if self._next_check.get(worker_id) != deadline:
+                continue  # 已被新心跳顺延或已注销
+            del self._next_check[worker_id]
+            due.append((worker_id, self.workers[worker_id]))
+        return due
+    
+    def _probe_worker(self, worker_id: str, worker) -> bool:
+        """在锁外探测一次心跳，返回 Worker 是否健康"""
+        if hasattr(worker, 'heartbeat') and callable(worker.heartbeat):
+            try:
+                status = worker.heartbeat()
+                if not self.notify_heartbeat(worker_id, status):
+                    return False
+                # 心跳返回了，但 Worker 自报 error 状态，同样需要重启
+                return status.get('status') != 'error'
+            except Exception as e:
+                logger.error(f"Error getting heartbeat from worker {worker_id}: {e}")
+                with self.worker_lock:
+                    if worker_id in self.worker_status:
+                        self.worker_status[worker_id]['status'] = 'error'
+                        self._publish_status()
+                return False
+        # 没有 heartbeat 接口的 Worker 只能依赖主动推送
+        worker_status = self._status_snapshot.get(worker_id)
+        return worker_status is None or (
+            worker_status['status'] != 'error' and
+            time.time() - worker_status['last_heartbeat'] <= self.heartbeat_timeout
+        )
     
     def _monitor_workers(self):
-        """监控所有 Worker 的状态"""
+        """监控所有 Worker 的状态
+
+        监控线程阻塞在条件变量上，直到最早的检查截止时间到达（或有注册/心跳事件唤醒），
+        而不是固定每 10 秒轮询一次；心跳探测在锁外进行，避免慢心跳阻塞 API 请求。
+        """
         logger.info("Starting worker monitor thread")
         
         while self.running:
-            current_time = time.time()
-            
-            with self.worker_lock:
-                for worker_id, worker in list(self.workers.items()):
-                    # 检查心跳
-                    if hasattr(worker, 'heartbeat') and callable(worker.heartbeat):
-                        try:
-                            status = worker.heartbeat()
-                            self.worker_status[worker_id].update({
-                                'last_heartbeat': current_time,
-                                'resources': status.get('resources', {}),
-                                'status': status.get('status', 'unknown')
-                            })
-                        except Exception as e:
-                            logger.error(f"Error getting heartbeat from worker {worker_id}: {e}")
-                            self.worker_status[worker_id]['status'] = 'error'
-                    
-                    # 检查是否需要重启
-                    if (self.worker_status[worker_id]['status'] == 'error' or 
-                        current_time - self.worker_status[worker_id]['last_heartbeat'] > 60):  # 60秒无响应
-                        logger.warning(f"Worker {worker_id} seems dead, attempting restart")
-                        self.restart_worker(worker_id)
+            with self._cond:
+                due = self._pop_due_workers(time.time())
+                if not due:
+                    timeout = (
+                        self._deadlines[0][0] - time.time()
+                        if self._deadlines else self.heartbeat_interval
+                    )
+                    self._cond.wait(timeout=max(0.0, timeout))
+                    continue
             
-            time.sleep(10)  # 每10秒检查一次
+            for worker_id, worker in due:
+                if self._probe_worker(worker_id, worker):
+                    continue
+                # restart_worker 自己会获取 worker_lock，必须在锁外调用
+                logger.warning(f"Worker {worker_id} seems dead, attempting restart")
+                self.restart_worker(worker_id)
+                with self._cond:
+                    if worker_id in self.workers and worker_id not in self._next_check:
+                        self._schedule_check(worker_id, time.time() + self.heartbeat_interval)
         
         logger.info("Worker monitor thread stopped")
     
@@ -171,14 +281,13 @@ class Coordinator:
             'worker_id': None
         }
         
-        with self.worker_lock:
-            for worker_id, status in self.worker_status.items():
-                if status['status'] == 'idle' or status['status'] == 'running':
-                    # 简单示例，实际中需要检查具体资源是否满足要求
-                    result['worker_id'] = worker_id
-                    result['allocated_resources'] = {'cpu': 1, 'memory': '1G'}
-                    break
-            else:
-                result['success'] = False
+        for worker_id, status in self._status_snapshot.items():
+            if status['status'] == 'idle' or status['status'] == 'running':
+                # 简单示例，实际中需要检查具体资源是否满足要求
+                result['worker_id'] = worker_id
+                result['allocated_resources'] = {'cpu': 1, 'memory': '1G'}
+                break
+        else:
+            result['success'] = False
         
         return result
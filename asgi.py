@@ -0,0 +1,25 @@
+"""ASGI 入口：由外部 ASGI 服务器托管 API，而不是在 main.py 里内嵌 uvicorn 线程
+
+    uvicorn asgi:app --loop uvloop --http httptools --uds /tmp/api.sock
+
+配置通过环境变量传入：
+    AEF_CONFIG    配置文件路径（默认 config.json）
+    AEF_ENV_TYPE  环境类型：android / android_world（默认 android）
+
+注意：每个进程都有自己的 Coordinator 和 Worker，trajectory 只存在于创建它的进程中。
+AndroidEnvironment 通过跨进程的设备认领锁保证各进程拿到不同的模拟器，但 --workers N
+共享同一个 socket 时请求会被随机分发到任意进程；多进程部署需要按 trajectory_id
+做粘性路由（例如每个进程监听独立端口 / socket，由前置代理按 trajectory_id 哈希转发）。
+"""
+import os
+from api.api_server import create_app
+from main import build_api_coordinator
+from utils.config import load_config
+
+config = load_config(os.environ.get('AEF_CONFIG', 'config.json'))
+coordinator = build_api_coordinator(config, os.environ.get('AEF_ENV_TYPE', 'android'))
+if coordinator is None:
+    raise RuntimeError(f"不支持的环境类型: {os.environ.get('AEF_ENV_TYPE')}")
+coordinator.start(block=False)
+
+app = create_app(coordinator)
@@ -6,28 +6,96 @@ This centralises DSL→JSONAction parsing so that both `AndroidEnvironment` (leg
  and `AndroidWorldAsyncEnvironment` use exactly the same rules.
 """
 
-from typing import Any
-import json
+import functools
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
 
 from android_world.env import json_action as aw_json
 
 __all__ = ["to_json_action", "dsl_to_json_action"]
 
 
+def _str_to_json_action(action: str) -> aw_json.JSONAction:  # type: ignore
+    # DSL strings vastly outnumber JSON strings, so only strip when needed and
+    # branch on the first character instead of startswith/endswith checks.
+    if action[:1].isspace():
+        action = action.strip()
+    if action[:1] == "{":
+        return aw_json.JSONAction(**orjson.loads(action))
+    return _dsl_cached(action)
+
+
+# Exact-type dispatch for the common inputs; subclasses fall back to isinstance.
+_DISPATCH: Dict[type, Callable[[Any], aw_json.JSONAction]] = {
+    str: _str_to_json_action,
+    dict: lambda action: aw_json.JSONAction(**action),
+    aw_json.JSONAction: lambda action: action,
+}
+
+
 def to_json_action(action: Any) -> aw_json.JSONAction:  # type: ignore
     """Converts *action* (dict / JSON string / DSL string / JSONAction) into JSONAction."""
-    if isinstance(action, aw_json.JSONAction):
-        return action
-    if isinstance(action, dict):
-        return aw_json.JSONAction(**action)
-    if isinstance(action, str):
-        stripped = action.strip()
-        if stripped.startswith("{") and stripped.endswith("}"):
-            return aw_json.JSONAction(**json.loads(stripped))
-        return dsl_to_json_action(stripped)
+    converter = _DISPATCH.get(type(action))
+    if converter is not None:
+        return converter(action)
+    for base, converter in _DISPATCH.items():
+        if isinstance(action, base):
+            return converter(action)
     raise ValueError(f"Unsupported action type: {type(action)}")
 
 
+def _parse_click(parts: List[str]) -> Optional[aw_json.JSONAction]:  # type: ignore
+    if len(parts) < 3:
+        return None
+    return aw_json.JSONAction(action_type=aw_json.CLICK, x=int(parts[1]), y=int(parts[2]))
+
+
+def _parse_text(parts: List[str]) -> Optional[aw_json.JSONAction]:  # type: ignore
+    text = " ".join(parts[1:])
+    if text.startswith('"') and text.endswith('"'):
+        text = text[1:-1]
+    return aw_json.JSONAction(action_type=aw_json.INPUT_TEXT, text=text)
+
+
+def _parse_swipe(parts: List[str]) -> Optional[aw_json.JSONAction]:  # type: ignore
+    if len(parts) < 5:
+        return None
+    # Heuristic: derive direction from coordinates
+    x1, y1, x2, y2 = map(int, parts[1:5])
+    dx, dy = x2 - x1, y2 - y1
+    if abs(dx) > abs(dy):
+        direction = "right" if dx > 0 else "left"
+    else:
+        direction = "down" if dy > 0 else "up"
+    return aw_json.JSONAction(action_type=aw_json.SWIPE, direction=direction)
+
+
+# Key actions carry no arguments, so one shared (read-only) instance per key
+# is handed out instead of allocating a new JSONAction per command.
+_KEY_ACTIONS = {
+    "back": aw_json.JSONAction(action_type=aw_json.NAVIGATE_BACK),
+    "home": aw_json.JSONAction(action_type=aw_json.NAVIGATE_HOME),
+    "enter": aw_json.JSONAction(action_type=aw_json.KEYBOARD_ENTER),
+}
+
+
+def _parse_key(parts: List[str]) -> Optional[aw_json.JSONAction]:  # type: ignore
+    if len(parts) < 2:
+        return None
+    return _KEY_ACTIONS.get(parts[1].lower())
+
+
+# First DSL token -> parser taking the pre-split command; a parser returns None
+# when the arguments don't fit so the caller can raise a uniform error.
+_HANDLERS: Dict[str, Callable[[List[str]], Optional[aw_json.JSONAction]]] = {
+    "click": _parse_click,
+    "swipe": _parse_swipe,
+    "text": _parse_text,
+    "key": _parse_key,
+}
+
+
 def dsl_to_json_action(cmd: str) -> aw_json.JSONAction:  # type: ignore
     """Very small DSL -> JSONAction mapping compatible with legacy commands.
 
@@ -40,33 +108,18 @@ def dsl_to_json_action(cmd: str) -> aw_json.JSONAction:  # type: ignore
     parts = cmd.split()
     if not parts:
         raise ValueError("Empty action command")
-    t = parts[0].lower()
-    if t == "click" and len(parts) >= 3:
-        return aw_json.JSONAction(action_type=aw_json.CLICK, x=int(parts[1]), y=int(parts[2]))
-
-    if t == "text":
-        text = " ".join(parts[1:])
-        if text.startswith('"') and text.endswith('"'):
-            text = text[1:-1]
-        return aw_json.JSONAction(action_type=aw_json.INPUT_TEXT, text=text)
-
-    if t == "swipe" and len(parts) >= 5:
-        # Heuristic: derive direction from coordinates
-        x1, y1, x2, y2 = map(int, parts[1:5])
-        dx, dy = x2 - x1, y2 - y1
-        if abs(dx) > abs(dy):
-            direction = "right" if dx > 0 else "left"
-        else:
-            direction = "down" if dy > 0 else "up"
-        return aw_json.JSONAction(action_type=aw_json.SWIPE, direction=direction)
-
-    if t == "key" and len(parts) >= 2:
-        key = parts[1].lower()
-        if key == "back":
-            return aw_json.JSONAction(action_type=aw_json.NAVIGATE_BACK)
-        if key == "home":
-            return aw_json.JSONAction(action_type=aw_json.NAVIGATE_HOME)
-        if key == "enter":
-            return aw_json.JSONAction(action_type=aw_json.KEYBOARD_ENTER)
-
-    raise ValueError(f"Cannot parse action DSL: {cmd}") 
\ No newline at end of file
+    handler = _HANDLERS.get(parts[0].lower())
+    action = handler(parts) if handler is not None else None
+    if action is None:
+        raise ValueError(f"Cannot parse action DSL: {cmd}")
+    return action
+
+
+@functools.lru_cache(maxsize=4096)
+def _dsl_cached(cmd: str) -> aw_json.JSONAction:  # type: ignore
+    """Memoized DSL parse for rollout loops that replay the same commands.
+
+    Callers share the returned instance, so it must be treated as read-only
+    (android_world deep-copies before modifying actions).
+    """
+    return dsl_to_json_action(cmd)
@@ -1,64 +1,430 @@
+import asyncio
 import os
 import uuid
 import time
 import subprocess
-import json
 import base64
+import fcntl
+import functools
+import hashlib
+import io
 import re
+import select
+import shlex
 import shutil
+import socket
+import struct
 import threading
-from typing import Dict, Any, Optional, List, Tuple
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple, Union, Set
+import orjson
 from environment.base import Environment
 from utils.logging import setup_logger
-import dataclasses
-from android_world.env import representation_utils as aw_repr
 from android_world.env import json_action as aw_json
 from environment.action_utils import to_json_action
 from android_world.env import adb_utils as aw_adb_utils  # type: ignore
 
 logger = setup_logger()
 
+# lxml 是可选依赖：有它时 UI 层次结构用 libxml2 解析，缺失时退回标准库（接口一致）
+try:
+    from lxml import etree as _xml_etree
+except Exception as import_err:
+    logger.debug("未安装 lxml，UI 层次结构使用 xml.etree 解析: %s", import_err)
+    _xml_etree = ET
+
+# Pillow 是可选依赖：配置 host_png_compress_level 时在主机端用低压缩级别编码 PNG
+try:
+    from PIL import Image
+except Exception as import_err:
+    logger.debug("未安装 Pillow，PNG 截图只能由设备端 screencap -p 编码: %s", import_err)
+    Image = None
+
+# uiautomator 的 bounds 属性形如 "[0,0][1080,2400]"
+_BOUNDS_RE = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+# `wm size` 输出形如 "Physical size: 1080x1920"
+_WM_SIZE_RE = re.compile(r"(\d+)x(\d+)")
+# dumpsys window 焦点行中的 "package/activity"
+_ACTIVITY_RE = re.compile(r'([\w\.]+/[\w\.]+)')
+
+
+def _bbox_dict(bounds: Optional[str]) -> Optional[Dict[str, int]]:
+    """把 bounds 字符串解析为 android_world BoundingBox 的字典形式"""
+    if not bounds:
+        return None
+    m = _BOUNDS_RE.match(bounds)
+    if m:
+        x_min, y_min, x_max, y_max = map(int, m.groups())
+    else:
+        x_min, y_min, x_max, y_max = map(int, bounds.strip('[]').replace('][', ',').split(','))
+    return {'x_min': x_min, 'x_max': x_max, 'y_min': y_min, 'y_max': y_max}
+
+
+# 文本命令 `key <name>` 中常用名称到 Android 键代码的映射（键均为小写）
+_KEY_MAPPING = {
+    'back': 'KEYCODE_BACK',
+    'home': 'KEYCODE_HOME',
+    'menu': 'KEYCODE_MENU',
+    'power': 'KEYCODE_POWER',
+    'enter': 'KEYCODE_ENTER',
+    'delete': 'KEYCODE_DEL',
+    'recents': 'KEYCODE_APP_SWITCH',
+    'volume_up': 'KEYCODE_VOLUME_UP',
+    'volume_down': 'KEYCODE_VOLUME_DOWN',
+}
+
+@functools.lru_cache(maxsize=256)
+def _get_app_activity(app_name: str) -> Optional[str]:
+    """应用名 -> 启动 Activity；android_world 每次都按正则表逐条匹配，而应用名词表很小，结果固定，直接缓存"""
+    return aw_adb_utils.get_adb_activity(app_name)
+
+
+def _input_text_arg(text: str) -> str:
+    """把文本转成 `input text` 的单个 shell 参数
+
+    `input text` 用 %s 表示空格；整体再按设备端 sh 的规则加引号，避免 ; & | ' " 等字符被 shell 解释
+    （adb shell 会把参数拼接后交给设备端 shell，常驻会话同理）。
+    """
+    return shlex.quote(text.replace(" ", "%s"))
+
+
+def _adb_keyboard_command(text: str) -> str:
+    """ADBKeyboard 的文本广播命令；按 base64 传递，任意字符都无需转义"""
+    return f"am broadcast -a ADB_INPUT_B64 --es msg {base64.b64encode(text.encode('utf-8')).decode('ascii')}"
+
+
+# 无参数的导航类 JSONAction -> keycode
+_JSON_ACTION_KEYS = {
+    aw_json.NAVIGATE_BACK: "KEYCODE_BACK",
+    aw_json.NAVIGATE_HOME: "KEYCODE_HOME",
+    aw_json.KEYBOARD_ENTER: "KEYCODE_ENTER",
+}
+
+# ADBKeyboard 输入法：文本经广播直接提交给输入框，不启动 `input` 的 Java 进程，也支持非 ASCII 字符
+_ADB_KEYBOARD_PACKAGE = "com.android.adbkeyboard"
+_ADB_KEYBOARD_IME = "com.android.adbkeyboard/.AdbIME"
+
+# 配置路径不存在时依次尝试的 emulator / adb 位置（裸名称表示在 PATH 中查找）
+_EMULATOR_CANDIDATES = (
+    'emulator',
+    '/opt/android-sdk/emulator/emulator',
+    '/root/.local/share/enroot/android-emulator/opt/android-sdk/emulator/emulator',
+    '/root/Android/Sdk/emulator/emulator',
+)
+_ADB_CANDIDATES = (
+    'adb',
+    '/opt/android-sdk/platform-tools/adb',
+    '/root/Android/Sdk/platform-tools/adb',
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_tool(configured: str, candidates: Tuple[str, ...]) -> str:
+    """返回可用的工具路径：configured 存在则直接使用，否则取第一个存在（或可在 PATH 中找到）的候选
+
+    结果按进程缓存，同一进程中创建多个环境实例时不再重复 stat / 遍历 PATH。
+    都找不到时返回 configured，由后续调用报错。
+    """
+    if os.path.exists(configured):
+        return configured
+    for path in candidates:
+        if os.path.exists(path) or shutil.which(path):
+            return path
+    return configured
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_avdmanager(configured: Optional[str], emulator_path: str) -> Optional[str]:
+    """按 显式配置 → 相对 emulator_path 推导的 SDK 目录 → PATH 的顺序查找 avdmanager，结果按进程缓存"""
+    candidates: List[str] = []
+    if configured:
+        candidates.append(configured)
+    sdk_root = os.path.abspath(os.path.join(emulator_path, os.pardir, os.pardir))
+    candidates.append(os.path.join(sdk_root, "cmdline-tools", "latest", "bin", "avdmanager"))
+    candidates.append(os.path.join(sdk_root, "tools", "bin", "avdmanager"))
+    candidates.append("avdmanager")
+    for cand in candidates:
+        if os.path.exists(cand) or shutil.which(cand):
+            return cand if os.path.isabs(cand) else shutil.which(cand)
+    return None
+
+
+# 合并观察脚本中各段输出之间的分隔行
+_OBS_SEPARATOR = "__INFIGUI_OBS_SEP__"
+_UI_DUMP_PATH = "/sdcard/window_dump.xml"
+# step_sequence 中每条命令后输出 "<marker><退出码>"，用于区分各动作是否成功
+_STEP_STATUS_MARKER = "__INFIGUI_STEP_RC__"
+_STEP_STATUS_RE = re.compile(re.escape(_STEP_STATUS_MARKER) + r"(\d+)")
+_HIERARCHY_END = b"</hierarchy>"
+
+# 在设备端先过滤出焦点窗口行，避免把整份 dumpsys window（数百 KB）传回主机
+_FOCUS_LINES_CMD = "dumpsys window windows | grep -E 'mCurrentFocus|mFocusedApp'"
+
+# 在设备端轮询开机完成，完成后立即退出
+_BOOT_WAIT_SCRIPT = 'while [ "$(getprop sys.boot_completed)" != "1" ]; do sleep 0.2; done'
+# 额外等待开机动画退出（service.bootanim.exit=1），此时 UI 才真正可操作
+_BOOT_ANIM_WAIT_SCRIPT = (
+    'while [ "$(getprop sys.boot_completed)" != "1" ] || [ "$(getprop service.bootanim.exit)" != "1" ]; '
+    'do sleep 0.2; done'
+)
+
+# screencap 原始输出头部里的像素格式（android PixelFormat，均为每像素 4 字节）
+_PIXEL_FORMATS = {1: "rgba8888", 2: "rgbx8888", 5: "bgra8888"}
+# 像素格式 -> Pillow (图像模式, raw 解码器模式)
+_PIL_MODES = {1: ("RGBA", "RGBA"), 2: ("RGB", "RGBX"), 5: ("RGBA", "BGRA")}
+
+
+class _AdbShellSession:
+    """设备上常驻的 `adb shell` 进程，逐条写入命令并按结束标记切分输出
+
+    每条命令后追加 printf 输出 "\n<marker><退出码>\n"，读到该标记即认为命令结束，
+    从而省去每条命令一次的 adb 进程启动和连接握手。同一会话内的命令必须串行（调用方持有 lock）。
+    """
+
+    def __init__(self, adb_path: str, device_id: str):
+        self.device_id = device_id
+        self.lock = threading.Lock()
+        self._marker = f"__INFIGUI_END_{os.urandom(4).hex()}__"
+        self._end_re = re.compile(b"\n" + re.escape(self._marker.encode()) + rb"(\d+)\n")
+        self._buf = bytearray()
+        self.proc = subprocess.Popen(
+            [adb_path, "-s", device_id, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, command: str, timeout: float) -> Tuple[bytes, int]:
+        """执行一条命令，返回 (stdout, 退出码)；超时或会话断开时关闭会话并抛异常"""
+        # 用 { } 包住命令并重定向 stdin，避免命令读走后续写入的协议内容
+        payload = f"{{ {command}\n}} </dev/null\nprintf '\\n{self._marker}%d\\n' $?\n"
+        try:
+            self.proc.stdin.write(payload.encode())
+        except OSError as e:
+            self.close()
+            raise subprocess.CalledProcessError(255, command, stderr=f"adb shell 会话已断开: {e}")
+
+        fd = self.proc.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        scan_from = 0
+        while True:
+            match = self._end_re.search(self._buf, scan_from)
+            if match:
+                output = bytes(self._buf[:match.start()])
+                returncode = int(match.group(1))  # 必须在截断缓冲区之前取出
+                del self._buf[:match.end()]
+                return output, returncode
+            # 标记可能跨两次读取，下次从末尾回退一个标记长度处继续查找
+            scan_from = max(0, len(self._buf) - len(self._marker) - 16)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.close()
+                raise subprocess.TimeoutExpired(command, timeout)
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                self.close()
+                raise subprocess.CalledProcessError(255, command, stderr="adb shell 会话已断开")
+            self._buf += chunk
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=2)
+        except Exception:
+            try:
+                self.proc.kill()
+            except Exception:
+                pass
+
+
+def _adb_server_exec(server: Tuple[str, int], serial: str, command: str, timeout: float) -> bytes:
+    """直接按 adb server 的 smart socket 协议执行 `exec:<command>`，返回设备端的原始 stdout
+
+    等价于 `adb -s <serial> exec-out <command>`，但不启动 adb 客户端进程：请求为 4 位十六进制
+    长度前缀 + 内容，server 回复 OKAY / FAIL；exec 服务成功后该连接即为输出流，读到 EOF 结束。
+    协议或连接出错时抛 OSError / RuntimeError，由调用方退回 adb 命令行。
+    """
+    def request(sock: socket.socket, payload: str):
+        data = payload.encode()
+        sock.sendall(b"%04x" % len(data) + data)
+        status = sock.recv(4, socket.MSG_WAITALL)
+        if status != b"OKAY":
+            message = b""
+            if status == b"FAIL":
+                length = int(sock.recv(4, socket.MSG_WAITALL) or b"0", 16)
+                message = sock.recv(length, socket.MSG_WAITALL)
+            raise RuntimeError(f"adb server 拒绝 {payload!r}: {status!r} {message!r}")
+
+    with socket.create_connection(server, timeout=timeout) as sock:
+        request(sock, f"host:transport:{serial}")
+        request(sock, f"exec:{command}")
+        chunks = []
+        while True:
+            chunk = sock.recv(1 << 20)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+
+class _ActionFormatError(ValueError):
+    """文本命令参数个数不对等格式错误，step() 直接作为 error 返回，不记错误日志"""
+
+
+class _MonkeyInjector:
+    """设备上常驻的 `monkey --port` 进程，经 adb forward 的 TCP 连接发送 tap / press / touch 命令
+
+    `input tap` 等每次都要启动一个 Java 进程；monkey 只在建立时启动一次，之后每条命令
+    只是一行文本。命令按行发送、逐行回复 OK / ERROR，多条命令可一次发送后依次读取回复。
+    """
+
+    def __init__(self, adb_path: str, device_id: str, device_port: int, timeout: float):
+        self.device_id = device_id
+        self.lock = threading.Lock()
+        self._adb_path = adb_path
+        self.proc = subprocess.Popen(
+            [adb_path, "-s", device_id, "shell", "monkey", "--port", str(device_port)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.sock: Optional[socket.socket] = None
+        self._reader = None
+        self.local_port: Optional[int] = None
+        try:
+            # tcp:0 由 adb 选择空闲的主机端口并打印出来，避免多模拟器争用同一端口
+            forward = subprocess.run(
+                [adb_path, "-s", device_id, "forward", "tcp:0", f"tcp:{device_port}"],
+                check=True, capture_output=True, text=True, timeout=timeout,
+            )
+            self.local_port = int(forward.stdout.strip())
+            self._connect(timeout)
+        except Exception:
+            self.close()
+            raise
+
+    def _connect(self, timeout: float):
+        """monkey 启动需要一点时间，端口可连且能应答前反复重试"""
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            try:
+                sock = socket.create_connection(("127.0.0.1", self.local_port), timeout=timeout)
+                reader = sock.makefile("rb")
+                sock.sendall(b"wake\n")
+                if reader.readline():
+                    self.sock, self._reader = sock, reader
+                    return
+                reader.close()
+                sock.close()
+            except OSError:
+                pass
+            if time.monotonic() + delay > deadline:
+                raise RuntimeError(f"monkey 注入通道未就绪（device_id={self.device_id}）")
+            time.sleep(delay)
+            delay = min(0.5, delay * 2)
+
+    def alive(self) -> bool:
+        return self.sock is not None and self.proc.poll() is None
+
+    def send(self, commands: List[str]):
+        """一次写入多条命令再依次读取回复；任一条返回 ERROR 或连接断开时抛异常"""
+        with self.lock:
+            self.sock.sendall("".join(f"{c}\n" for c in commands).encode())
+            for command in commands:
+                reply = self._reader.readline()
+                if not reply.startswith(b"OK"):
+                    raise RuntimeError(f"monkey 命令失败: {command!r} -> {reply.strip()!r}")
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.sendall(b"quit\n")
+            except OSError:
+                pass
+            try:
+                self._reader.close()
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+        if self.local_port is not None:
+            subprocess.run(
+                [self._adb_path, "-s", self.device_id, "forward", "--remove", f"tcp:{self.local_port}"],
+                capture_output=True,
+            )
+            self.local_port = None
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=2)
+        except Exception:
+            try:
+                self.proc.kill()
+            except Exception:
+                pass
+
+
+@dataclass(slots=True)
+class EmulatorInfo:
+    """active_emulators 中单个 trajectory 对应的模拟器状态"""
+    device_id: str
+    port: int
+    process: Optional[subprocess.Popen] = None  # 复用外部 emulator 时无法取得进程句柄
+    snapshot_name: str = ''
+    status: str = 'running'  # starting / running / saved
+    created_time: float = 0.0
+    loaded_time: float = 0.0
+    snapshot_path: Optional[str] = None
+    last_action: Any = None
+    last_action_time: int = 0  # time.monotonic_ns()，只用于比较先后和计算间隔，不是墙钟时间
+    last_screenshot: Optional[Tuple[str, bytes]] = None  # (etag, png)，供 get_screenshot(cached=True)
+    step_count: int = 0  # 文本命令执行次数，配合 ui_stride 决定哪些步骤采集 UI 层次结构
+
+
 class AndroidEnvironment(Environment):
     """
     Android环境实现，通过ADB与Android模拟器交互
     """
+
+    # 本进程中已确认存在的 AVD 目录，_ensure_avd_exists 命中后不再 stat / 查找 avdmanager
+    _verified_avds: Set[str] = set()
     
     # ------------------------------------------------------------------
     # Helper: ensure AVD exists locally – create it on-the-fly if absent
     # ------------------------------------------------------------------
-    def _ensure_avd_exists(self):
-        """若 avd 不存在，使用 avdmanager 自动创建。"""
+    def _avd_path(self) -> str:
+        """本地 AVD 目录（<ANDROID_AVD_HOME>/<avd_name>.avd）"""
         avd_home = os.environ.get("ANDROID_AVD_HOME") or os.path.join(os.path.expanduser("~"), ".android", "avd")
-        avd_path = os.path.join(avd_home, f"{self.avd_name}.avd")
+        return os.path.join(avd_home, f"{self.avd_name}.avd")
 
+    def _ensure_avd_exists(self):
+        """若 avd 不存在，使用 avdmanager 自动创建。"""
+        avd_path = self._avd_path()
+        if avd_path in self._verified_avds:
+            return
         if os.path.exists(avd_path):
+            self._verified_avds.add(avd_path)
             return  # 已存在
 
-        logger.info(f"检测到 AVD '{self.avd_name}' 不存在，尝试自动创建…")
-
-        # 尝试定位 avdmanager
-        avdmanager_candidates: List[str] = []
-        # 1) 显式配置
-        if hasattr(self, "config") and self.config.get("avdmanager_path"):
-            avdmanager_candidates.append(self.config["avdmanager_path"])
-
-        # 2) 相对 emulator_path 推导
-        try:
-            sdk_root = os.path.abspath(os.path.join(self.emulator_path, os.pardir, os.pardir))
-            avdmanager_candidates.append(os.path.join(sdk_root, "cmdline-tools", "latest", "bin", "avdmanager"))
-            avdmanager_candidates.append(os.path.join(sdk_root, "tools", "bin", "avdmanager"))
-        except Exception:
-            pass
-
-        # 3) PATH 中
-        avdmanager_candidates.append("avdmanager")
-
-        avdmanager_path = None
-        for cand in avdmanager_candidates:
-            if cand and (os.path.exists(cand) or shutil.which(cand)):
-                avdmanager_path = cand if os.path.isabs(cand) else shutil.which(cand)
-                break
+        logger.info("检测到 AVD '%s' 不存在，尝试自动创建…", self.avd_name)
 
+        avdmanager_path = _resolve_avdmanager(
+            self.config.get("avdmanager_path") if hasattr(self, "config") else None,
+            self.emulator_path,
+        )
         if not avdmanager_path:
             logger.error("未找到 avdmanager，可在 config['avdmanager_path'] 指定路径")
             raise RuntimeError("无法创建 AVD：未找到 avdmanager")
@@ -92,6 +458,7 @@ class AndroidEnvironment(Environment):
             logger.info("创建 AVD 命令: %s", " ".join(create_cmd))
             subprocess.run(create_cmd, check=True, input="no\n", text=True)  # --force 仍可能询问 overwrite，输入 no
             logger.info("AVD '%s' 创建成功", self.avd_name)
+            self._verified_avds.add(avd_path)
         except subprocess.CalledProcessError as e:
             logger.error("自动创建 AVD 失败: %s", e)
             raise RuntimeError("自动创建 AVD 失败")
@@ -103,27 +470,37 @@ class AndroidEnvironment(Environment):
 
     def _try_claim_device(self, device_id: str) -> bool:
         """Attempt to atomically claim an emulator so that only one worker uses it.
-        Return True if claim succeeds, False otherwise."""
+        Return True if claim succeeds, False otherwise.
+
+        The claim is an flock on <_CLAIM_DIR>/<device_id>.lock held for as long as we
+        manage the device; the kernel drops it when the process exits, so a crashed
+        worker never leaves a stale claim behind. The claim is not re-entrant: a device
+        already claimed by this process (e.g. by a concurrent create()) returns False."""
+        if device_id in self._claim_fds:
+            return False
         try:
             os.makedirs(self._CLAIM_DIR, exist_ok=True)
             lock_path = os.path.join(self._CLAIM_DIR, f"{device_id}.lock")
-            # Use os.O_CREAT|os.O_EXCL for atomic create
-            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            os.close(fd)
-            return True
-        except FileExistsError:
-            return False
+            fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
         except Exception:
             return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._claim_fds[device_id] = fd
+        return True
 
     def _release_claim(self, device_id: str):
-        """Release the claim for a device (called when we stop/remove the emulator)."""
-        try:
-            lock_path = os.path.join(self._CLAIM_DIR, f"{device_id}.lock")
-            if os.path.exists(lock_path):
-                os.remove(lock_path)
-        except Exception:
-            pass
+        """Release the claim for a device (called when we stop/remove the emulator).
+        The lock file itself stays; unlinking it could let two workers lock different inodes."""
+        fd = self._claim_fds.pop(device_id, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
     
     # ------------------------------------------------------------------
     # Helper: find an already running emulator that is not yet managed
@@ -142,7 +519,7 @@ class AndroidEnvironment(Environment):
                         device_id = f"emulator-{adb_port}"
                         # Skip ones we already track
                         if any(
-                            emu.get("device_id") == device_id for emu in self.active_emulators.values()
+                            emu.device_id == device_id for emu in self.active_emulators.values()
                         ):
                             continue
                         # cross-process claim check
@@ -163,60 +540,129 @@ class AndroidEnvironment(Environment):
         self.emulator_path = config.get('emulator_path', '/root/Android/Sdk/emulator/emulator')
         self.adb_path = config.get('adb_path', '/root/Android/Sdk/platform-tools/adb')
 
-        # ---- 动态查找 emulator 可执行文件 ----
-        if not os.path.exists(self.emulator_path):
-            alternative_emulator_paths = [
-                'emulator',  # 在 PATH 中查找
-                '/opt/android-sdk/emulator/emulator',
-                '/root/.local/share/enroot/android-emulator/opt/android-sdk/emulator/emulator',
-                '/root/Android/Sdk/emulator/emulator'
-            ]
-            for path in alternative_emulator_paths:
-                try:
-                    if os.path.exists(path) or (path == 'emulator' and shutil.which(path)):
-                        self.emulator_path = path
-                        logger.info(f"Using alternative emulator path: {self.emulator_path}")
-                        break
-                except Exception:
-                    pass
+        # ---- 动态查找 emulator / adb 可执行文件 ----
+        configured_emulator = self.emulator_path
+        self.emulator_path = _resolve_tool(configured_emulator, _EMULATOR_CANDIDATES)
+        if self.emulator_path != configured_emulator:
+            logger.info("Using alternative emulator path: %s", self.emulator_path)
+        self.adb_path = _resolve_tool(self.adb_path, _ADB_CANDIDATES)
 
-        # ---- 动态查找 adb 可执行文件 ----
-        #（adb 的初始值已在上方设定，这里复用并在后续段落检查是否存在）
         self.avd_name = config.get('avd_name', 'Pixel6_API33')  # 默认使用 Pixel6 API33 模拟器
         # trajectory_id -> emulator_info  (populated dynamically)
-        self.active_emulators: Dict[str, Dict[str, Any]] = {}
+        self.active_emulators: Dict[str, EmulatorInfo] = {}
+        # device_id -> 持有 flock 的认领锁文件描述符，见 _try_claim_device
+        self._claim_fds: Dict[str, int] = {}
 
         # 锁用于并发情况下的端口分配，避免冲突。
         self._port_lock = threading.Lock()
+        # 本实例已占用的 console 端口（adb 端口为 +1），在 create / load / remove 中增量维护，受 _port_lock 保护
+        self._used_ports: set = set()
         
         # 额外的配置参数
         self.base_port = config.get('base_port', 5554)  # 模拟器基础端口
+        # 从 base_port 起搜索的端口跨度；emulator 只接受 5554-5682 的 console 端口，默认正好覆盖
+        self.port_range = config.get('port_range', 128)
         self.boot_timeout = config.get('boot_timeout', 60)  # 启动超时时间（秒）
+        # 同时处于开机阶段的模拟器上限：开机吃满 CPU 与磁盘 I/O，并发过多时每台都变慢、更易超时。
+        # 只限制启动到开机完成这一段，复用 / 预热领取不受影响
+        self._boot_sem = threading.BoundedSemaphore(
+            config.get('max_parallel_boots', max(1, min((os.cpu_count() or 4) // 3, 8)))
+        )
         self.dump_ui_timeout = config.get('dump_ui_timeout', 5)  # UI转储超时时间（秒）
+        # 共享的基础快照名（默认关闭）：配置且 AVD 中存在该快照时 create() 以只读方式从快照恢复（约 5s），
+        # 否则冷启动（30-60s）；可用 bootstrap_base_snapshot() 生成，为空则总是冷启动
+        self.base_snapshot = config.get('base_snapshot', '')
+        # 开机等待是否同时要求开机动画已退出；部分镜像在 -no-boot-anim 下不设置该属性，默认关闭
+        self.wait_boot_anim = config.get('wait_boot_anim', False)
+        # uiautomator dump --compressed：只保留重要节点，XML 更小，但 ui_elements 会少于完整 dump
+        self.ui_dump_compressed = config.get('ui_dump_compressed', False)
+        # 流式 dump（/dev/tty）拿不到 XML、临时文件方式却成功的设备：之后直接走临时文件，不再先试流式
+        self._ui_dump_via_file: set = set()
+        # 动作后每 ui_stride 步采集一次 UI 层次结构（uiautomator dump 是单步最大开销）；
+        # 1 为每步都采集，0 为仅 screenshot 动作采集；step(include_ui=...) 可逐次覆盖
+        self.ui_stride = config.get('ui_stride', 1)
+        # device_id -> (width, height)：AVD 运行期间屏幕尺寸不变，首次读取后缓存，停止/移除时失效
+        self._screen_size_cache: Dict[str, Tuple[int, int]] = {}
+        # UI XML 的 blake2b 摘要 -> ui_elements，所有设备共享的 LRU：界面未变化或回到之前的界面时
+        # XML 逐字节相同，直接复用解析结果；观察线程池并发访问，由 _ui_elements_lock 保护
+        self.ui_cache_size = config.get('ui_cache_size', 64)
+        self._ui_elements_cache: "OrderedDict[bytes, List[Dict[str, Any]]]" = OrderedDict()
+        self._ui_elements_lock = threading.Lock()
+        # device_id -> 屏幕保持唤醒的截止时间（time.monotonic）；期间截图跳过唤醒 + 滑动 + 等待
+        self.awake_window = config.get('awake_window', 10)
+        self._awake_until: Dict[str, float] = {}
+        # 启动时把 screen_off_timeout 调到最大并 `svc power stayon true`，屏幕不再自动熄灭。
+        # 会持久修改设备设置（随快照保存，也作用于共享 / 真机设备），默认关闭
+        self.keep_screen_on = config.get('keep_screen_on', False)
+        # 已设置常亮并解锁的设备；截图前不再唤醒 / 轻滑 / 等待
+        self._stay_on: Set[str] = set()
+        # device_id -> 常驻 adb shell 会话；`shell` 类命令复用它，避免每条命令启动一个 adb 进程
+        self.persistent_shell = config.get('persistent_shell', True)
+        self.shell_timeout = config.get('shell_timeout', 30)  # 单条 shell 命令超时时间（秒）
+        self._shells: Dict[str, _AdbShellSession] = {}
+        self._shells_lock = threading.Lock()
+        # 截图直接连 adb server（ANDROID_ADB_SERVER_PORT，默认 5037）执行 exec:，省去每次启动 adb 客户端进程；
+        # 连接或协议出错时退回 `adb exec-out`
+        self.adb_server_socket = config.get('adb_server_socket', True)
+        self._adb_server = ("127.0.0.1", int(os.environ.get("ANDROID_ADB_SERVER_PORT", 5037)))
+        # 输入注入方式：shell（默认，`input tap` 等经常驻 shell 执行）/ monkey（设备端常驻 monkey --port，
+        # 点击、滑动、按键不再每次启动 Java 进程）；monkey 通道不可用时自动退回 shell
+        self.input_injector = config.get('input_injector', 'shell')
+        # 文本输入方式：input（默认，`input text`）/ adb_keyboard（ADBKeyboard 广播，支持中文等非 ASCII 文本）；
+        # 设备上未安装 ADBKeyboard 时安装 adb_keyboard_apk，不可用则退回 input text
+        self.text_input = config.get('text_input', 'input')
+        self.adb_keyboard_apk = config.get('adb_keyboard_apk')
+        self._adb_keyboard_ready: Dict[str, bool] = {}  # device_id -> ADBKeyboard 是否已设为当前输入法
+        # 文本命令名 -> 处理函数，step() 按首个单词直接查表分派
+        self._action_handlers = {
+            "click": self._do_click,
+            "swipe": self._do_swipe,
+            "text": self._do_text,
+            "key": self._do_key,
+            "screenshot": self._do_screenshot,
+        }
+        self.monkey_port = config.get('monkey_port', 1080)  # 设备端 monkey 监听端口
+        self._injectors: Dict[str, _MonkeyInjector] = {}
+        # 截图格式：png_b64（默认，兼容旧客户端）/ png / raw，见 _screenshot_observation
+        self.screenshot_format = config.get('screenshot_format', 'png_b64')
+        # 设为 0-9 时 PNG 改为取原始 framebuffer 后在主机端编码（1 约比默认级别快数倍，体积略大）；
+        # 为空时仍由设备端 screencap -p 编码。需要 Pillow
+        self.host_png_compress_level = config.get('host_png_compress_level')
+        if self.host_png_compress_level is not None and Image is None:
+            logger.warning("host_png_compress_level 需要 Pillow，退回设备端 PNG 编码")
+            self.host_png_compress_level = None
+        # 观察采集线程池：截图与 UI / activity 查询都是 I/O 等待，可并行
+        self._obs_pool = ThreadPoolExecutor(
+            max_workers=config.get('obs_workers', 4), thread_name_prefix='android-obs'
+        )
+
+        # 预热池：提前启动 warm_pool 个模拟器，create() 直接领取，省去冷启动等待；领取后后台补充
+        self.warm_pool_size = config.get('warm_pool', 0)
+        # 以下状态都由 _warm_lock 保护：
+        # _warm_ready：已开机、待领取的 (port, _start_emulator 结果)；只放成功的模拟器
+        # _warm_waiters：池空时 create() 登记的等待者，按先后由完成的预热直接交付；
+        #   等待者数量不超过 _warm_inflight，保证每个等待者都有一台在途的模拟器兜底
+        # _warm_timers：失败后等待重试的定时器，close() 时取消
+        self._warm_ready: "deque[Tuple[int, Dict[str, Any]]]" = deque()
+        self._warm_waiters: "deque[Future]" = deque()
+        self._warm_inflight = 0
+        self._warm_timers: Set[threading.Timer] = set()
+        self._warm_closed = False
+        self._warm_lock = threading.Lock()
+        # 预热失败后同一槽位最多补启动几次（间隔指数退避），避免 AVD 损坏时反复开机
+        self.warm_pool_retries = config.get('warm_pool_retries', 3)
 
         # 确保快照目录存在
         os.makedirs(self.snapshot_dir, exist_ok=True)
         
-        # 检查 ADB 服务器 - 如果指定的路径不存在，尝试使用可能在环境中的其他路径
-        if not os.path.exists(self.adb_path):
-            alternative_paths = [
-                'adb',  # 如果在PATH中
-                '/opt/android-sdk/platform-tools/adb',
-                '/root/Android/Sdk/platform-tools/adb'
-            ]
-            for path in alternative_paths:
-                try:
-                    if os.path.exists(path) or (path == 'adb' and shutil.which(path)):
-                        self.adb_path = path
-                        break
-                except:
-                    pass
-        
         self._ensure_adb_server()
         
-        logger.info(f"Android Environment initialized with snapshot dir: {self.snapshot_dir}")
-        logger.info(f"Using Emulator path: {self.emulator_path}")
-        logger.info(f"Using ADB path: {self.adb_path}")
+        for _ in range(self.warm_pool_size):
+            self._replenish_warm_pool()
+        
+        logger.info("Android Environment initialized with snapshot dir: %s", self.snapshot_dir)
+        logger.info("Using Emulator path: %s", self.emulator_path)
+        logger.info("Using ADB path: %s", self.adb_path)
     
     def _ensure_adb_server(self):
         """确保 ADB 服务器正在运行"""
@@ -224,11 +670,15 @@ class AndroidEnvironment(Environment):
             subprocess.run([self.adb_path, "start-server"], check=True, capture_output=True)
             logger.info("ADB 服务器已启动")
         except subprocess.CalledProcessError as e:
-            logger.error(f"启动 ADB 服务器失败: {e}")
+            logger.error("启动 ADB 服务器失败: %s", e)
             raise RuntimeError(f"无法启动 ADB 服务器: {e}")
     
-    def _execute_adb_command(self, device_id: str, *args) -> subprocess.CompletedProcess:
-        """执行 ADB 命令并返回结果"""
+    def _execute_adb_command(self, device_id: str, *args, text: bool = True,
+                             timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        """执行 ADB 命令并返回结果；text=False 时 stdout 为原始 bytes，省去大输出的解码
+
+        timeout 为空时 shell 命令使用 shell_timeout，其余命令不限时。
+        """
         cmd = [self.adb_path]
         
         if device_id:
@@ -237,51 +687,180 @@ class AndroidEnvironment(Environment):
         cmd.extend(args)
         
         try:
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            if device_id and self.persistent_shell and len(args) > 1 and args[0] == "shell":
+                # 与 `adb shell a b c` 一致：参数以空格拼接后交给设备端 shell 解释
+                stdout, returncode = self._shell_exec(device_id, " ".join(args[1:]), text=text, timeout=timeout)
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, cmd, output=stdout, stderr="")
+                return subprocess.CompletedProcess(cmd, returncode, stdout=stdout, stderr="")
+            result = subprocess.run(cmd, check=True, capture_output=True, text=text, timeout=timeout)
             return result
         except subprocess.CalledProcessError as e:
-            logger.error(f"执行 ADB 命令失败: {e}, stderr: {e.stderr}")
+            logger.error("执行 ADB 命令失败: %s, stderr: %s", e, e.stderr)
             raise
     
-    def _get_free_port_pair(self) -> Tuple[int, int]:
-        """获取可用的端口对（控制台端口和 ADB 端口）"""
-        base_port = self.base_port
-        
-        # 查找已经使用的端口（① 本进程已启动的 emulator ② adb devices 中已存在的 emulator）
-        used_ports: set[int] = set()
+    def _shell_exec(self, device_id: str, command: str, text: bool = True,
+                    timeout: Optional[float] = None) -> Tuple[Any, int]:
+        """在设备的常驻 shell 会话中执行命令，返回 (stdout, 退出码)；会话不存在或已退出时重建"""
+        with self._shells_lock:
+            session = self._shells.get(device_id)
+            if session is None or not session.alive():
+                session = _AdbShellSession(self.adb_path, device_id)
+                self._shells[device_id] = session
+        with session.lock:
+            stdout, returncode = session.run(command, timeout or self.shell_timeout)
+        if text:
+            return stdout.decode("utf-8", errors="replace"), returncode
+        return stdout, returncode
+    
+    def _close_shell(self, device_id: str):
+        """关闭设备的常驻 shell 会话和 monkey 注入通道（停止 / 移除模拟器时调用）"""
+        with self._shells_lock:
+            session = self._shells.pop(device_id, None)
+            injector = self._injectors.pop(device_id, None)
+        if session is not None:
+            session.close()
+        if injector is not None:
+            injector.close()
+
+    def _monkey_injector(self, device_id: str) -> Optional[_MonkeyInjector]:
+        """返回设备的 monkey 注入通道（按需建立）；未启用或建立失败时返回 None"""
+        if self.input_injector != 'monkey':
+            return None
+        with self._shells_lock:
+            injector = self._injectors.get(device_id)
+            if injector is not None and injector.alive():
+                return injector
+            self._injectors.pop(device_id, None)
+        if injector is not None:
+            injector.close()
+        try:
+            injector = _MonkeyInjector(self.adb_path, device_id, self.monkey_port, self.shell_timeout)
+        except Exception as e:
+            logger.warning("建立 monkey 注入通道失败，退回 input 命令: %s", e)
+            return None
+        with self._shells_lock:
+            self._injectors[device_id] = injector
+        return injector
 
-        # ① 当前 Environment 启动的实例
-        for emulator_info in self.active_emulators.values():
-            port_val = emulator_info.get('port')
-            if port_val is not None:
-                used_ports.add(port_val)
-                used_ports.add(port_val + 1)  # adb 端口
+    def _inject(self, device_id: str, monkey_commands: List[str], shell_command: str):
+        """优先经 monkey 通道发送 monkey_commands，通道不可用时执行等价的 shell_command
 
-        # ② 系统中其它 emulator – 解析 adb devices 输出
+        发送中途出错时部分命令可能已送达设备，再执行 shell_command 会重复点击 / 滑动，
+        因此不退回而是抛出异常；出错的通道被丢弃，下次注入时重建。
+        """
+        injector = self._monkey_injector(device_id)
+        if injector is None:
+            self._execute_adb_command(device_id, "shell", shell_command)
+            return
         try:
-            adb_list = subprocess.run(
-                [self.adb_path, "devices"], capture_output=True, text=True, check=True
+            injector.send(monkey_commands)
+        except Exception as e:
+            logger.warning("monkey 注入失败: %s", e)
+            with self._shells_lock:
+                if self._injectors.get(device_id) is injector:
+                    del self._injectors[device_id]
+            injector.close()
+            raise
+
+    def _ensure_adb_keyboard(self, device_id: str) -> bool:
+        """确保 ADBKeyboard 已安装并设为当前输入法（每台设备只检查一次）"""
+        ready = self._adb_keyboard_ready.get(device_id)
+        if ready is not None:
+            return ready
+        ready = False
+        try:
+            installed = self._execute_adb_shell_script(
+                device_id, f"pm path {_ADB_KEYBOARD_PACKAGE} || true"
+            ).strip()
+            if not installed and self.adb_keyboard_apk:
+                self._execute_adb_command(device_id, "install", "-r", self.adb_keyboard_apk, timeout=120)
+                installed = "package:"
+            if installed:
+                self._execute_adb_shell_script(
+                    device_id, f"ime enable {_ADB_KEYBOARD_IME} && ime set {_ADB_KEYBOARD_IME}"
+                )
+                ready = True
+            else:
+                logger.warning("设备 %s 未安装 ADBKeyboard 且未配置 adb_keyboard_apk，退回 input text", device_id)
+        except Exception as e:
+            logger.warning("启用 ADBKeyboard 失败，退回 input text: %s", e)
+        self._adb_keyboard_ready[device_id] = ready
+        return ready
+
+    def _text_command(self, device_id: str, text: str) -> str:
+        """输入文本的设备端 shell 命令：按 text_input 配置选择 ADBKeyboard 广播或 `input text`"""
+        if self.text_input == 'adb_keyboard' and self._ensure_adb_keyboard(device_id):
+            return _adb_keyboard_command(text)
+        return f"input text {_input_text_arg(text)}"
+
+    def _tap(self, device_id: str, x: int, y: int, count: int = 1):
+        """点击 (x, y)；count=2 为双击，两次点击间隔 50ms"""
+        monkey_commands = [f"tap {x} {y}"]
+        shell_commands = [f"input tap {x} {y}"]
+        for _ in range(count - 1):
+            monkey_commands += ["sleep 50", f"tap {x} {y}"]
+            shell_commands += ["sleep 0.05", f"input tap {x} {y}"]
+        self._inject(device_id, monkey_commands, "; ".join(shell_commands))
+
+    def _swipe(self, device_id: str, x1: int, y1: int, x2: int, y2: int, duration_ms: int):
+        """从 (x1, y1) 滑动到 (x2, y2)；起止点相同即为长按"""
+        steps = 10
+        monkey_commands = [f"touch down {x1} {y1}"]
+        for i in range(1, steps + 1):
+            monkey_commands.append(f"sleep {duration_ms // steps}")
+            monkey_commands.append(
+                f"touch move {x1 + (x2 - x1) * i // steps} {y1 + (y2 - y1) * i // steps}"
             )
-            for line in adb_list.stdout.splitlines():
-                if line.startswith("emulator-"):
-                    try:
-                        adb_port = int(line.split("\t")[0].split("-")[1])
-                        console_port = adb_port - 1
-                        used_ports.add(console_port)
-                        used_ports.add(adb_port)
-                    except Exception:
-                        pass
-        except Exception:
-            # adb 可能暂未启动，忽略即可
-            pass
-        
-        # 端口必须是偶数 (emulator console 端口)，adb 端口为 console+1
-        port = base_port if base_port % 2 == 0 else base_port + 1
+        monkey_commands.append(f"touch up {x2} {y2}")
+        self._inject(device_id, monkey_commands, f"input swipe {x1} {y1} {x2} {y2} {duration_ms}")
 
-        while port in used_ports:
-            port += 2  # 依次尝试下一个偶数端口
+    def _keyevent(self, device_id: str, key_code: str):
+        self._inject(device_id, [f"press {key_code}"], f"input keyevent {shlex.quote(key_code)}")
+    
+    def _execute_adb_shell_script(self, device_id: str, script: str, text: bool = True,
+                                  timeout: Optional[float] = None) -> Any:
+        """在设备上用一次 `adb shell` 执行整段 shell 脚本，返回 stdout（text=False 时为 bytes）"""
+        return self._execute_adb_command(device_id, "shell", script, text=text, timeout=timeout).stdout
+    
+    def _get_free_port_pair(self) -> Tuple[int, int]:
+        """获取可用的端口对（控制台端口和 ADB 端口）；调用方需持有 _port_lock 并自行登记到 _used_ports"""
+        base_port = self.base_port
+        
+        # 本进程已登记的端口；其它进程/其它 worker 的 emulator 已经 listen 在端口上，
+        # 下面的 bind 探测即可发现，无需再调用一次 adb devices 解析输出
+        used_ports = set(self._used_ports)
 
-        return port, port + 1
+        # 端口必须是偶数 (emulator console 端口)，adb 端口为 console+1
+        first_port = base_port if base_port % 2 == 0 else base_port + 1
+
+        # 实际 bind 探测，避开被本机其它进程（包括其它 worker 的 emulator）占用的端口
+        for port in range(first_port, first_port + self.port_range, 2):
+            if port in used_ports:
+                continue
+            if self._port_is_free(port) and self._port_is_free(port + 1):
+                return port, port + 1
+
+        raise RuntimeError(
+            f"没有可用的模拟器端口（{first_port}-{first_port + self.port_range - 1} 均被占用）"
+        )
+    
+    def _release_port(self, port: Optional[int]):
+        if port is not None:
+            with self._port_lock:
+                self._used_ports.discard(port)
+    
+    @staticmethod
+    def _port_is_free(port: int) -> bool:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            # SO_REUSEADDR：刚退出的 emulator 残留的 TIME_WAIT 连接不算占用，
+            # 但仍在 listen 的端口会 bind 失败
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(("127.0.0.1", port))
+                return True
+            except OSError:
+                return False
     
     def _start_emulator(self, trajectory_id: str, port: int) -> Dict[str, Any]:
         """启动模拟器并等待它准备好接收命令"""
@@ -293,98 +872,24 @@ class AndroidEnvironment(Environment):
         adb_port = port + 1
         device_id = f"emulator-{adb_port}"
         snapshot_name = f"sandbox_{trajectory_id[:8]}"
+        # 有基础快照时以只读方式从快照恢复（多实例可并发，退出时不回写基础快照）；
+        # snapshot_name 仍是本轨迹的快照名
+        boot_snapshot = self.base_snapshot if self._has_base_snapshot() else None
         
-        logger.info(f"启动 Android 模拟器，端口: {port}，AVD: {self.avd_name}")
-        
-        # ---------------- 构建启动命令 -----------------
-        cfg = getattr(self, "config", {})  # 从传入配置读取额外开关
-
-        cmd = [self.emulator_path, "-avd", self.avd_name, "-port", str(port)]
-
-        # gRPC 端口（方便后续调试/集成）
-        cmd.extend(["-grpc", str(port + 1000)])
-
-        # 启动选项按 config 开关附加（默认为 True）
-        if cfg.get("no_window", True):
-            cmd.append("-no-window")
-        if cfg.get("no_audio", True):
-            cmd.append("-no-audio")
-        if cfg.get("no_boot_anim", True):
-            cmd.append("-no-boot-anim")
-
-        # 只在需要独占写入时用 -wipe-data，否则默认 -read-only 允许多实例并发
-        if cfg.get("wipe_data", False):
-            cmd.append("-wipe-data")
-        else:
-            # read_only 默认为 True，可通过 config 关闭
-            if cfg.get("read_only", True):
-                cmd.append("-read-only")
-
-        # 不保存/加载快照（外部另外管理）
-        if cfg.get("no_snapshot", True):
-            cmd.append("-no-snapshot")
-
-        # 加速开关：on/off，默认为 on
-        accel_flag = cfg.get("accel", "on")
-        cmd.extend(["-accel", accel_flag])
+        logger.info("启动 Android 模拟器，端口: %s，AVD: %s，快照: %s", port, self.avd_name, boot_snapshot)
         
         try:
-            logger.info("启动命令: %s", " ".join(cmd))
-
-            # 将 emulator 输出写入独立日志文件，方便调试
-            print(self.config.get('emulator_log_dir', '/tmp'))
-            log_dir = self.config.get('emulator_log_dir', '/tmp') if hasattr(self, 'config') else '/tmp'
-            os.makedirs(log_dir, exist_ok=True)
-            log_file_path = os.path.join(log_dir, f"emulator_{trajectory_id[:8]}.log")
-            log_file_handle = open(log_file_path, 'w')
-            logger.info(f"Emulator stdout/stderr → {log_file_path}")
-
-            # 捕获输出到文件；如需在终端实时查看可使用 tail -f
-            emulator_process = subprocess.Popen(cmd, stdout=log_file_handle, stderr=log_file_handle)
-            
-            # import pdb; pdb.set_trace()
-            
-            # 等待模拟器启动
-            start_time = time.time()
-            device_ready = False
-            
-            while time.time() - start_time < self.boot_timeout:
-                try:
-                    # 检查设备是否在线
-                    result = subprocess.run(
-                        [self.adb_path, "devices"],
-                        check=True,
-                        capture_output=True,
-                        text=True,
-                    )
-                    
-                    if device_id in result.stdout:
-                        # 检查设备是否已经完全启动
-                        boot_completed = subprocess.run(
-                            [self.adb_path, "-s", device_id, "shell", "getprop", "sys.boot_completed"],
-                            check=True,
-                            capture_output=True,
-                            text=True,
-                        )
-                        
-                        if "1" in boot_completed.stdout:
-                            device_ready = True
-                            break
-                    
-                    elapsed = int(time.time() - start_time)
-                    logger.info(f"等待模拟器启动中… 已用 {elapsed}s (device_id={device_id})")
-                    time.sleep(5)
-                except Exception as e:
-                    logger.warning(f"等待模拟器启动时出错: {e}")
-                    time.sleep(5)
+            with self._boot_sem:
+                emulator_process = self._launch_emulator(
+                    trajectory_id, port, boot_snapshot, shared_snapshot=boot_snapshot is not None
+                )
+                
+                # 等待模拟器启动
+                device_ready = self._wait_for_boot(device_id, self.boot_timeout)
             
             if not device_ready:
                 # 超时，终止模拟器进程
                 emulator_process.terminate()
-                try:
-                    log_file_handle.close()
-                except Exception:
-                    pass
                 try:
                     emulator_process.wait(timeout=5)
                 except subprocess.TimeoutExpired:
@@ -401,12 +906,6 @@ class AndroidEnvironment(Environment):
             # 创建 baseline snapshot（若需要）
             self._ensure_baseline_snapshot(device_id)
             
-            # 关闭日志文件句柄，避免文件描述符泄漏
-            try:
-                log_file_handle.flush()
-            except Exception:
-                pass
-
             return {
                 'success': True,
                 'device_id': device_id,
@@ -415,207 +914,653 @@ class AndroidEnvironment(Environment):
                 'snapshot_name': snapshot_name
             }
         except Exception as e:
-            logger.error(f"启动模拟器失败: {e}")
+            logger.error("启动模拟器失败: %s", e)
             return {
                 'success': False,
                 'error': f"启动模拟器失败: {str(e)}"
             }
     
+    def _has_base_snapshot(self) -> bool:
+        """AVD 中是否已有 base_snapshot（直接检查 snapshots/ 目录，不必为 -snapshot-list 启动 emulator）"""
+        if not self.base_snapshot:
+            return False
+        return os.path.isdir(os.path.join(self._avd_path(), "snapshots", self.base_snapshot))
+
+    def bootstrap_base_snapshot(self) -> Dict[str, Any]:
+        """冷启动一次模拟器并保存为 base_snapshot，之后的 create() 都从该快照恢复"""
+        if not self.base_snapshot:
+            return {'success': False, 'error': 'base_snapshot 未配置'}
+        try:
+            self._ensure_avd_exists()
+            with self._port_lock:
+                port, adb_port = self._get_free_port_pair()
+                self._used_ports.add(port)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        device_id = f"emulator-{adb_port}"
+        emulator_process = None
+        try:
+            # 需要可写启动，否则 -read-only / -no-snapshot 下无法保存快照
+            with self._boot_sem:
+                emulator_process = self._launch_emulator(f"base_{self.base_snapshot}", port, writable=True)
+                booted = self._wait_for_boot(device_id, self.boot_timeout)
+            if not booted:
+                return {'success': False, 'error': f"启动模拟器超时（{self.boot_timeout}秒）"}
+            self._unlock_screen(device_id)
+            result = self._execute_adb_command(device_id, "emu", "avd", "snapshot", "save", self.base_snapshot)
+            if "KO" in result.stdout:
+                return {'success': False, 'error': result.stdout.strip()}
+            logger.info("基础快照 '%s' 已保存到 AVD %s", self.base_snapshot, self.avd_name)
+            return {'success': True, 'snapshot_name': self.base_snapshot}
+        except Exception as e:
+            logger.error("生成基础快照失败: %s", e)
+            return {'success': False, 'error': str(e)}
+        finally:
+            self._stop_emulator(device_id)
+            if emulator_process is not None:
+                try:
+                    emulator_process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    emulator_process.kill()
+            self._release_port(port)
+
+    def _launch_emulator(self, trajectory_id: str, port: int,
+                         snapshot_name: Optional[str] = None,
+                         writable: bool = False,
+                         shared_snapshot: bool = False) -> subprocess.Popen:
+        """构建 emulator 启动参数并启动进程（不等待开机），create 与 load 共用
+
+        snapshot_name 为空时全新启动（按 config 附加 -wipe-data / -read-only / -no-snapshot，
+        writable=True 时不附加，以便保存快照）；否则以 -snapshot <name> -snapshot-load 从快照恢复。
+        shared_snapshot=True 表示从多个实例共用的基础快照恢复：附加 -no-snapshot-save，
+        且按 read_only 开关附加 -read-only，否则同一 AVD 只能起一个实例，emu kill 时还会把状态回写进基础快照。
+        """
+        cfg = getattr(self, "config", {})  # 从传入配置读取额外开关
+
+        cmd = [self.emulator_path, "-avd", self.avd_name, "-port", str(port)]
+
+        # gRPC 端口（方便后续调试/集成）
+        cmd.extend(["-grpc", str(port + 1000)])
+
+        # 启动选项按 config 开关附加（默认为 True）
+        if cfg.get("no_window", True):
+            cmd.append("-no-window")
+        if cfg.get("no_audio", True):
+            cmd.append("-no-audio")
+        if cfg.get("no_boot_anim", True):
+            cmd.append("-no-boot-anim")
+
+        if snapshot_name:
+            cmd.extend(["-snapshot", snapshot_name, "-snapshot-load"])
+            if shared_snapshot:
+                if cfg.get("read_only", True):
+                    cmd.append("-read-only")
+                cmd.append("-no-snapshot-save")
+        elif not writable:
+            # 只在需要独占写入时用 -wipe-data，否则默认 -read-only 允许多实例并发
+            if cfg.get("wipe_data", False):
+                cmd.append("-wipe-data")
+            else:
+                # read_only 默认为 True，可通过 config 关闭
+                if cfg.get("read_only", True):
+                    cmd.append("-read-only")
+
+            # 不保存/加载快照（外部另外管理）
+            if cfg.get("no_snapshot", True):
+                cmd.append("-no-snapshot")
+
+        # 加速开关：on/off，默认为 on
+        accel_flag = cfg.get("accel", "on")
+        cmd.extend(["-accel", accel_flag])
+
+        logger.info("启动命令: %s", " ".join(cmd))
+
+        # 将 emulator 输出写入独立日志文件，方便调试；如需在终端实时查看可使用 tail -f
+        # stdin 接 /dev/null：emulator 不继承 worker 的终端或管道（close_fds 默认已开启）
+        with self._open_emulator_log(trajectory_id) as log_file_handle:
+            return subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=log_file_handle, stderr=subprocess.STDOUT,
+            )
+
+    def _open_emulator_log(self, trajectory_id: str):
+        """打开 emulator 的 stdout/stderr 日志文件
+
+        子进程继承文件描述符后父进程即可关闭句柄；输出不经过管道，也就不会因为无人读取
+        而写满管道缓冲区、阻塞模拟器。父进程从不写入该句柄，以二进制追加模式打开即可，
+        缓冲设置与子进程的写入无关。
+        """
+        log_dir = self.config.get('emulator_log_dir', '/tmp') if hasattr(self, 'config') else '/tmp'
+        os.makedirs(log_dir, exist_ok=True)
+        log_file_path = os.path.join(log_dir, f"emulator_{trajectory_id[:8]}.log")
+        logger.info("Emulator stdout/stderr → %s", log_file_path)
+        return open(log_file_path, 'ab')
+
+    def _wait_for_boot(self, device_id: str, timeout: float) -> bool:
+        """等待设备启动完成，超时返回 False
+
+        用 adb 原生的 wait-for-device 等设备上线，再在设备端循环检查 sys.boot_completed
+        （wait_boot_anim 开启时还要求 service.bootanim.exit），一次 adb 调用即可在启动完成的
+        瞬间返回；adbd 重启等导致调用失败时指数退避后重试。
+        """
+        script = _BOOT_ANIM_WAIT_SCRIPT if self.wait_boot_anim else _BOOT_WAIT_SCRIPT
+        start_time = time.monotonic()
+        deadline = start_time + timeout
+        delay = 0.1
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                subprocess.run(
+                    [self.adb_path, "-s", device_id, "wait-for-device", "shell", script],
+                    check=True,
+                    capture_output=True,
+                    timeout=remaining,
+                )
+                return True
+            except subprocess.TimeoutExpired:
+                return False
+            except Exception as e:
+                elapsed = int(time.monotonic() - start_time)
+                logger.warning("等待模拟器启动时出错（已用 %ss, device_id=%s）: %s", elapsed, device_id, e)
+                # 退避不超过剩余时间，避免超时后还多睡一个间隔
+                time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                delay = min(2.0, delay * 1.5)
+    
     def _unlock_screen(self, device_id: str):
-        """解锁模拟器屏幕"""
+        """解锁模拟器屏幕：唤醒、（可选）关闭自动熄屏、上滑解锁合并为一次 shell 调用"""
         try:
             # 唤醒设备
-            self._execute_adb_command(device_id, "shell", "input", "keyevent", "KEYCODE_WAKEUP")
+            commands = ["input keyevent KEYCODE_WAKEUP"]
+            if self.keep_screen_on:
+                # 一次性关闭自动熄屏，之后截图前基本不需要再唤醒
+                commands.append("settings put system screen_off_timeout 2147483647")
+                # 模拟器始终处于“插电”状态，stayon 让屏幕在插电时一直亮着
+                commands.append("svc power stayon true")
             
-            # 向上滑动解锁
+            # 向上滑动解锁（屏幕尺寸按 device_id 缓存，后续 load / 截图不再查询）
             screen_size = self._get_screen_size(device_id)
             if screen_size:
                 width, height = screen_size
-                self._execute_adb_command(
-                    device_id, "shell", "input", "swipe",
-                    str(width // 2), str(height * 2 // 3),
-                    str(width // 2), str(height // 3),
-                    "300"  # 滑动时间（毫秒）
-                )
+                # 滑动时间 300 毫秒
+                commands.append("input swipe %d %d %d %d 300" % (width // 2, height * 2 // 3, width // 2, height // 3))
+            self._execute_adb_shell_script(device_id, "; ".join(commands))
+            self._mark_awake(device_id)
+            if self.keep_screen_on:
+                self._stay_on.add(device_id)
         except Exception as e:
-            logger.warning(f"解锁屏幕失败（可能已经解锁）: {e}")
+            logger.warning("解锁屏幕失败（可能已经解锁）: %s", e)
     
     def _get_screen_size(self, device_id: str) -> Optional[Tuple[int, int]]:
-        """获取屏幕尺寸"""
+        """获取屏幕尺寸（按 device_id 缓存）"""
+        cached = self._screen_size_cache.get(device_id)
+        if cached is not None:
+            return cached
         try:
             result = self._execute_adb_command(
                 device_id, "shell", "wm", "size"
             )
             
             # 解析输出，格式通常是 "Physical size: 1080x1920"
-            match = re.search(r"(\d+)x(\d+)", result.stdout)
+            match = _WM_SIZE_RE.search(result.stdout)
             if match:
-                width = int(match.group(1))
-                height = int(match.group(2))
-                return (width, height)
+                size = (int(match.group(1)), int(match.group(2)))
+                self._screen_size_cache[device_id] = size
+                return size
         except Exception as e:
-            logger.error(f"获取屏幕尺寸失败: {e}")
+            logger.error("获取屏幕尺寸失败: %s", e)
         
         return None
     
+    def _forget_device(self, device_id: str):
+        """清除按 device_id 缓存的设备状态并关闭其常驻 shell / monkey 通道（停止或移除模拟器时调用）"""
+        self._screen_size_cache.pop(device_id, None)
+        self._adb_keyboard_ready.pop(device_id, None)
+        self._ui_dump_via_file.discard(device_id)
+        self._awake_until.pop(device_id, None)
+        self._stay_on.discard(device_id)
+        self._close_shell(device_id)
+
     def _stop_emulator(self, device_id: str):
         """停止模拟器"""
+        self._forget_device(device_id)
         try:
             # 使用 ADB 的 emu kill 命令
             self._execute_adb_command(device_id, "emu", "kill")
-            logger.info(f"已停止模拟器 {device_id}")
+            logger.info("已停止模拟器 %s", device_id)
             return True
         except Exception as e:
-            logger.error(f"停止模拟器失败: {e}")
+            logger.error("停止模拟器失败: %s", e)
             return False
     
-    def _take_screenshot(self, device_id: str) -> Optional[str]:
-        """获取设备屏幕截图，返回 Base64 编码的图像数据"""
-        try:
-            # 在截图前先唤醒屏幕，确保不是黑屏状态
-            try:
-                # 唤醒设备
-                self._execute_adb_command(device_id, "shell", "input", "keyevent", "KEYCODE_WAKEUP")
-                # 短暂等待屏幕完全唤醒
-                import time
-                time.sleep(0.5)
-                
-                # 发送一个轻微的向上滑动来确保屏幕处于活跃状态
-                screen_size = self._get_screen_size(device_id)
-                if screen_size:
-                    width, height = screen_size
-                    # 轻微向上滑动，不会触发解锁但能保持屏幕活跃
-                    self._execute_adb_command(
-                        device_id, "shell", "input", "swipe",
-                        str(width // 2), str(height - 100),
-                        str(width // 2), str(height - 200),
-                        "100"  # 短时间滑动
-                    )
-                    time.sleep(0.3)
-            except Exception as e:
-                logger.warning(f"唤醒屏幕时出现问题，继续截图: {e}")
-            
-            # 执行屏幕截图命令，返回二进制数据
-            result = subprocess.run(
-                [self.adb_path, "-s", device_id, "exec-out", "screencap", "-p"],
-                check=True,
-                capture_output=True  # 不要设置 text=True，保持二进制数据
+    def _mark_awake(self, device_id: str):
+        """记录设备刚收到输入事件 / 刚被唤醒，awake_window 秒内截图无需再唤醒"""
+        self._awake_until[device_id] = time.monotonic() + self.awake_window
+
+    def _wake_script(self, device_id: str) -> str:
+        """返回截图前唤醒屏幕的设备端命令前缀；awake_window 内已唤醒过则返回空串
+
+        唤醒、等待、轻滑都放在设备端执行，和 screencap 合并成一次 exec-out 调用。
+        keep_screen_on 已生效的设备屏幕不会熄灭，始终返回空串。
+        """
+        if device_id in self._stay_on:
+            return ""
+        if time.monotonic() < self._awake_until.get(device_id, 0.0):
+            return ""
+        # 唤醒设备并短暂等待屏幕完全唤醒（亮屏在 100ms 量级完成，0.15s 足够）
+        script = "input keyevent KEYCODE_WAKEUP; sleep 0.15; "
+        screen_size = self._get_screen_size(device_id)
+        if screen_size:
+            width, height = screen_size
+            # 轻微向上滑动（100ms），不会触发解锁但能保持屏幕活跃
+            script += (
+                f"input swipe {width // 2} {height - 100} {width // 2} {height - 200} 100; sleep 0.3; "
             )
+        return script
+
+    def _capture_screenshot(self, device_id: str, raw: bool = False) -> Optional[bytes]:
+        """获取设备屏幕截图，返回原始 PNG 字节；raw=True 时返回未编码的 framebuffer（含头部）"""
+        if not raw and self.host_png_compress_level is not None:
+            data = self._capture_screenshot(device_id, raw=True)
+            decoded = self._decode_raw_screencap(data) if data else None
+            return self._encode_png(decoded, self.host_png_compress_level) if decoded else None
+        try:
+            # 在截图前先唤醒屏幕，确保不是黑屏状态；input 命令没有输出，stdout 只有截图数据
+            wake = self._wake_script(device_id)
+            # 不带 -p 时设备端跳过 PNG 编码，直接输出 framebuffer
+            screencap = "screencap" if raw else "screencap -p"
+            stdout = None
+            if self.adb_server_socket:
+                try:
+                    stdout = _adb_server_exec(self._adb_server, device_id, f"{wake}{screencap}", self.shell_timeout)
+                except Exception as e:
+                    logger.debug("adb server 直连截图失败，退回 adb exec-out: %s", e)
+            if stdout is None:
+                stdout = subprocess.run(
+                    [self.adb_path, "-s", device_id, "exec-out", f"{wake}{screencap}"],
+                    check=True,
+                    capture_output=True  # 不要设置 text=True，保持二进制数据
+                ).stdout
+            if wake:
+                self._mark_awake(device_id)
             
-            # Base64 编码图像数据
-            if result.stdout:
-                return base64.b64encode(result.stdout).decode('utf-8')
+            if stdout:
+                return stdout
         except Exception as e:
-            logger.error(f"获取屏幕截图失败: {e}")
+            logger.error("获取屏幕截图失败: %s", e)
         
         return None
+
+    @staticmethod
+    def _decode_raw_screencap(data: bytes) -> Optional[Tuple[bytes, int, int, int]]:
+        """解析 `screencap` 原始输出，返回 (RGBA 像素, 宽, 高, 像素格式)
+
+        头部为小端 uint32 的 width、height、format（新系统还多一个 colorspace），
+        因此头部长度按 总长度 - width*height*4 计算。
+        """
+        if len(data) < 12:
+            return None
+        width, height, pixel_format = struct.unpack_from('<III', data)
+        header_size = len(data) - width * height * 4
+        if header_size not in (12, 16):
+            logger.warning("无法识别的 screencap 原始输出: %sx%s, %s bytes", width, height, len(data))
+            return None
+        return data[header_size:], width, height, pixel_format
+
+    @staticmethod
+    def _encode_png(decoded: Tuple[bytes, int, int, int], compress_level: int) -> Optional[bytes]:
+        """把 _decode_raw_screencap 的结果在主机端编码为 PNG"""
+        pixels, width, height, pixel_format = decoded
+        modes = _PIL_MODES.get(pixel_format)
+        if modes is None:
+            logger.warning("不支持的 screencap 像素格式: %s", pixel_format)
+            return None
+        mode, raw_mode = modes
+        image = Image.frombuffer(mode, (width, height), pixels, "raw", raw_mode, 0, 1)
+        buf = io.BytesIO()
+        image.save(buf, format="PNG", compress_level=compress_level)
+        return buf.getvalue()
+
+    def _screenshot_observation(self, device_id: str, emulator_info: EmulatorInfo) -> Dict[str, Any]:
+        """按 screenshot_format 截图并返回要合入 observation 的字段，失败时返回空字典
+
+        - png_b64（默认）：base64 编码的 PNG 字符串
+        - png：原始 PNG bytes（API 以 JSON 返回时仍会 base64，msgpack 则保持二进制）
+        - raw：设备端不做 PNG 编码，返回 4 字节/像素的像素 bytes 及 image_size / image_format，
+          可用 np.frombuffer(image, np.uint8).reshape(h, w, 4) 还原
+        """
+        if self.screenshot_format == 'raw':
+            data = self._capture_screenshot(device_id, raw=True)
+            decoded = self._decode_raw_screencap(data) if data else None
+            if decoded is None:
+                return {}
+            pixels, width, height, pixel_format = decoded
+            return {
+                "image": pixels,
+                "image_format": _PIXEL_FORMATS.get(pixel_format, str(pixel_format)),
+                "image_size": (width, height),
+            }
+
+        png = self._capture_screenshot(device_id)
+        if not png:
+            return {}
+        etag = self._remember_screenshot(emulator_info, png)
+        image = png if self.screenshot_format == 'png' else base64.b64encode(png).decode('utf-8')
+        return {"image": image, "screenshot_etag": etag}
+
+    def get_screenshot(self, trajectory_id: str, cached: bool = False) -> Dict[str, Any]:
+        """返回原始 PNG 截图及其 ETag（供二进制接口直接透传，不做 base64）
+
+        cached=True 时优先返回最近一次 step 截图的结果，不再访问设备。
+        trajectory_id 未知时结果带 not_found=True，与截图失败区分。
+        """
+        emulator_info = self.active_emulators.get(trajectory_id)
+        if emulator_info is None:
+            return {'success': False, 'error': f"未知的 trajectory_id: {trajectory_id}", 'not_found': True}
+
+        last = emulator_info.last_screenshot
+        if cached and last is not None:
+            etag, png = last
+            return {'success': True, 'image': png, 'etag': etag}
+
+        png = self._capture_screenshot(emulator_info.device_id)
+        if not png:
+            return {'success': False, 'error': '获取屏幕截图失败'}
+        etag = self._remember_screenshot(emulator_info, png)
+        return {'success': True, 'image': png, 'etag': etag}
+
+    @staticmethod
+    def _remember_screenshot(emulator_info: EmulatorInfo, png: bytes) -> str:
+        """缓存最近一次截图，返回其内容哈希作为 ETag"""
+        etag = hashlib.blake2b(png, digest_size=16).hexdigest()
+        emulator_info.last_screenshot = (etag, png)
+        return etag
     
-    def _dump_ui_hierarchy(self, device_id: str) -> Optional[str]:
-        """获取 UI 层次结构，使用 uiautomator dump 命令"""
+    @property
+    def _ui_dump_stream_cmd(self) -> str:
+        """把 UI 层次结构直接写到 stdout 的 uiautomator 命令
+
+        设备端 timeout 把 uiautomator 限制在 dump_ui_timeout 秒内：它和 activity / 屏幕尺寸查询
+        在同一段脚本中执行，卡住时只丢掉 UI 这一段，不会拖到整段脚本的 shell_timeout。
+        """
+        compressed = "--compressed " if self.ui_dump_compressed else ""
+        return f"timeout {self.dump_ui_timeout} uiautomator dump {compressed}/dev/tty 2>/dev/null || true"
+
+    @staticmethod
+    def _extract_hierarchy(output: bytes) -> Optional[bytes]:
+        """从 uiautomator 流式输出（bytes）中截出 XML，去掉末尾的 "UI hierchary dumped to: ..." 提示行"""
+        start = output.find(b'<?xml')
+        if start < 0:
+            start = output.find(b'<hierarchy')
+        end = output.rfind(_HIERARCHY_END)
+        if start < 0 or end < 0:
+            return None
+        return output[start:end + len(_HIERARCHY_END)]
+
+    def _resolve_ui_dump(self, device_id: str, output: Optional[bytes]) -> Optional[Union[str, bytes]]:
+        """从流式 dump 的输出中取 XML；没有时退回临时文件方式
+
+        output 为 None 表示这次没有尝试流式 dump。流式没有 XML 而临时文件拿到了，说明该镜像
+        不支持输出到 /dev/tty，记入 _ui_dump_via_file，之后跳过流式尝试。
+        """
+        xml_data = self._extract_hierarchy(output) if output else None
+        if xml_data:
+            return xml_data
+        xml_data = self._dump_ui_hierarchy_to_file(device_id)
+        if output is not None and isinstance(xml_data, bytes):
+            logger.info("设备 %s 不支持流式 UI 转储，之后改用临时文件方式", device_id)
+            self._ui_dump_via_file.add(device_id)
+        return xml_data
+
+    def _dump_ui_hierarchy_to_file(self, device_id: str) -> Optional[Union[str, bytes]]:
+        """经由设备上的临时文件获取 UI 层次结构（部分系统镜像不支持输出到 /dev/tty）
+
+        转储、读取、删除临时文件在一次 shell 调用中完成：uiautomator dump 写完文件才返回，
+        以退出码决定是否 cat，无需等待或单独检查文件是否存在。
+        """
+        temp_file = _UI_DUMP_PATH
         try:
-            # 将 XML 文件转储到临时文件
-            temp_file = "/sdcard/window_dump.xml"
-            
-            # 首先尝试转储UI
-            dump_result = self._execute_adb_command(
-                device_id, "shell", "uiautomator", "dump", temp_file
-            )
-            
-            # 等待文件创建完成
-            import time
-            time.sleep(0.5)
-            
-            # 检查文件是否存在
-            check_result = subprocess.run(
-                [self.adb_path, "-s", device_id, "shell", "test", "-f", temp_file],
-                capture_output=True
-            )
-            
-            if check_result.returncode != 0:
-                logger.warning(f"UI转储文件不存在，尝试备用方法")
-                # 尝试使用 dumpsys activity top 作为备用
-                try:
-                    fallback_result = self._execute_adb_command(
-                        device_id, "shell", "dumpsys", "activity", "top"
-                    )
-                    if fallback_result.stdout:
-                        return f"<activity_info>{fallback_result.stdout}</activity_info>"
-                except:
-                    pass
-                return None
-            
-            # 读取内容
-            result = self._execute_adb_command(
-                device_id, "shell", "cat", temp_file
+            output = self._execute_adb_shell_script(
+                device_id,
+                f"timeout {self.dump_ui_timeout} uiautomator dump {temp_file} >/dev/null 2>&1 "
+                f"&& cat {temp_file}; rm -f {temp_file}",
+                text=False,
+                # 主机端多留 2 秒，让设备端 timeout 先生效，常驻 shell 会话不必因超时重建
+                timeout=self.dump_ui_timeout + 2,
             )
+            ui_xml = self._extract_hierarchy(output)
+            if ui_xml:
+                return ui_xml
             
-            # 删除临时文件
+            logger.warning("UI转储文件不存在，尝试备用方法")
+            # 尝试使用 dumpsys activity top 作为备用
             try:
-                self._execute_adb_command(
-                    device_id, "shell", "rm", temp_file
+                fallback_result = self._execute_adb_command(
+                    device_id, "shell", "dumpsys", "activity", "top"
                 )
-            except:
-                pass  # 删除失败不影响主要功能
-            
-            return result.stdout if result.stdout else None
-            
+                if fallback_result.stdout:
+                    return f"<activity_info>{fallback_result.stdout}</activity_info>"
+            except Exception:
+                pass
         except Exception as e:
-            logger.warning(f"转储 UI 层次结构失败，这不会影响基本功能: {e}")
+            logger.warning("转储 UI 层次结构失败，这不会影响基本功能: %s", e)
         
         return None
     
-    def _parse_ui_elements(self, xml_data: str) -> List[Dict[str, Any]]:
-        """使用 android_world.env.representation_utils 将 UI 层次结构 XML 解析为元素列表"""
+    def _parse_ui_elements(self, xml_data: Union[str, bytes]) -> List[Dict[str, Any]]:
+        """将 UI 层次结构 XML 解析为元素列表
+
+        输出与 android_world.env.representation_utils.xml_dump_to_ui_elements 再经
+        dataclasses.asdict 的结果一致（字段、顺序、先序遍历、跳过根节点），但直接读取
+        属性生成字典，不经过 dataclass。整段 XML 一次性交给 C 解析器（装有 lxml 时为
+        libxml2），再用 iter('node') 按标签过滤、先序遍历：dump 只有数百 KB，建树的内存
+        可以忽略，却省掉了 iterparse 每个 start/end 事件回到 Python 的开销。
+        """
+        if isinstance(xml_data, str):
+            xml_data = xml_data.encode('utf-8')
         try:
-            elements = aw_repr.xml_dump_to_ui_elements(xml_data)
-            # 将 dataclass 转换为普通字典，方便后续 JSON 序列化
-            return [dataclasses.asdict(el) for el in elements]
+            elements = []
+            # 根节点是 <hierarchy>，其余元素均为 <node>
+            for elem in _xml_etree.fromstring(xml_data).iter('node'):
+                get = elem.attrib.get
+                bbox = _bbox_dict(get('bounds'))
+                elements.append({
+                    'text': get('text'),
+                    'content_description': get('content-desc'),
+                    'class_name': get('class'),
+                    'bbox': bbox,
+                    'bbox_pixels': dict(bbox) if bbox is not None else None,
+                    'hint_text': None,
+                    'is_checked': get('checked') == 'true',
+                    'is_checkable': get('checkable') == 'true',
+                    'is_clickable': get('clickable') == 'true',
+                    'is_editable': None,
+                    'is_enabled': get('enabled') == 'true',
+                    'is_focused': get('focused') == 'true',
+                    'is_focusable': get('focusable') == 'true',
+                    'is_long_clickable': get('long-clickable') == 'true',
+                    'is_scrollable': get('scrollable') == 'true',
+                    'is_selected': get('selected') == 'true',
+                    'is_visible': True,
+                    'package_name': get('package'),
+                    'resource_name': None,
+                    'tooltip': None,
+                    'resource_id': get('resource-id'),
+                    'metadata': None,
+                })
+            return elements
         except Exception as e:
-            logger.warning(f"解析 UI 元素失败: {e}")
+            logger.warning("解析 UI 元素失败: %s", e)
             return []
     
-    def _get_current_activity(self, device_id: str) -> Optional[str]:
-        """获取当前活动"""
-        try:
-            # 获取窗口信息，不使用管道
-            result = self._execute_adb_command(
-                device_id, "shell", "dumpsys", "window", "windows"
-            )
-            
-            # 在Python中过滤输出，寻找焦点窗口
-            if result.stdout:
-                lines = result.stdout.split('\n')
-                for line in lines:
-                    if 'mCurrentFocus' in line or 'mFocusedApp' in line:
-                        # 解析输出，寻找类似 "mCurrentFocus=Window{...}"
-                        import re
-                        match = re.search(r'([\w\.]+/[\w\.]+)', line)
-                        if match:
-                            return match.group(1)
-        except Exception as e:
-            logger.error(f"获取当前活动失败: {e}")
-        
+    def _cached_ui_elements(self, device_id: str, xml_data: Union[str, bytes]) -> List[Dict[str, Any]]:
+        """解析 UI XML；最近 ui_cache_size 个界面中有逐字节相同的 XML（按 blake2b 摘要比较）时跳过解析"""
+        if isinstance(xml_data, str):
+            xml_data = xml_data.encode('utf-8')
+        digest = hashlib.blake2b(xml_data, digest_size=16).digest()
+        with self._ui_elements_lock:
+            cached = self._ui_elements_cache.get(digest)
+            if cached is not None:
+                self._ui_elements_cache.move_to_end(digest)
+                return cached
+        elements = self._parse_ui_elements(xml_data)
+        if self.ui_cache_size > 0:
+            with self._ui_elements_lock:
+                self._ui_elements_cache[digest] = elements
+                while len(self._ui_elements_cache) > self.ui_cache_size:
+                    self._ui_elements_cache.popitem(last=False)
+        return elements
+
+    @staticmethod
+    def _parse_focused_activity(window_dump: str) -> Optional[str]:
+        """从 dumpsys window 输出的 mCurrentFocus / mFocusedApp 行中解析 package/activity"""
+        for line in window_dump.split('\n'):
+            if 'mCurrentFocus' in line or 'mFocusedApp' in line:
+                # 解析输出，寻找类似 "mCurrentFocus=Window{...}"
+                match = _ACTIVITY_RE.search(line)
+                if match:
+                    return match.group(1)
         return None
     
+    def _warm_one(self, attempt: int = 0):
+        """启动一个预热模拟器，交给等待中的 create() 或放入 _warm_ready（在后台线程中运行）
+
+        失败时只在在途模拟器不够分给所有等待者时，让最后登记的等待者改走冷启动；
+        随后按 5s、10s、20s…（上限 60s）退避补启动，同一槽位累计失败超过 warm_pool_retries 次后放弃。
+        close() 之后才开机完成的模拟器直接停止。
+        """
+        warm_id = f"warm_{os.urandom(4).hex()}"
+        port = None
+        result: Dict[str, Any] = {'success': False, 'error': '预热线程异常退出'}
+        try:
+            if not self._warm_closed:
+                with self._port_lock:
+                    port, _ = self._get_free_port_pair()
+                    self._used_ports.add(port)
+                result = self._start_emulator(warm_id, port)
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        finally:
+            if result['success']:
+                self._warm_done(port, result)
+            else:
+                self._release_port(port)
+                self._warm_failed(attempt, result)
+
+    def _warm_done(self, port: int, result: Dict[str, Any]):
+        with self._warm_lock:
+            self._warm_inflight -= 1
+            closed = self._warm_closed
+            waiter = self._warm_waiters.popleft() if self._warm_waiters and not closed else None
+            if waiter is None and not closed:
+                self._warm_ready.append((port, result))
+        if closed:
+            logger.info("预热模拟器 %s 在关闭后才就绪，直接停止", result['device_id'])
+            self._stop_emulator(result['device_id'])
+            self._release_port(port)
+        elif waiter is not None:
+            waiter.set_result((port, result))
+        else:
+            logger.info("预热模拟器 %s 就绪（池中 %s 个）", result['device_id'], len(self._warm_ready))
+
+    def _warm_failed(self, attempt: int, result: Dict[str, Any]):
+        with self._warm_lock:
+            self._warm_inflight -= 1
+            if self._warm_closed:
+                return
+            # 剩余在途模拟器不够分时，最后登记的等待者不再等，改走冷启动
+            waiter = (
+                self._warm_waiters.pop() if len(self._warm_waiters) > self._warm_inflight else None
+            )
+            retry = attempt < self.warm_pool_retries
+            if retry:
+                delay = min(5 * 2 ** attempt, 60)
+                timer = threading.Timer(delay, self._retry_warm, args=(attempt + 1,))
+                timer.daemon = True
+                self._warm_timers.add(timer)
+                timer.start()
+        logger.warning("预热模拟器启动失败: %s", result.get('error'))
+        if waiter is not None:
+            waiter.set_result(None)
+        if retry:
+            logger.info("%s 秒后重新预热（第 %s 次重试）", delay, attempt + 1)
+        else:
+            logger.error("预热模拟器连续失败 %s 次，该槽位不再补充", attempt + 1)
+
+    def _retry_warm(self, attempt: int):
+        with self._warm_lock:
+            # 定时器回调就运行在该 Timer 线程中
+            self._warm_timers.discard(threading.current_thread())
+        self._replenish_warm_pool(attempt)
+
+    def _replenish_warm_pool(self, attempt: int = 0):
+        with self._warm_lock:
+            if self._warm_closed:
+                return
+            self._warm_inflight += 1
+        threading.Thread(target=self._warm_one, args=(attempt,), name='android-warm', daemon=True).start()
+
+    def _claim_warm_emulator(self, trajectory_id: str) -> Optional[str]:
+        """从预热池领取一个模拟器登记到 trajectory_id 名下，返回 device_id
+
+        池中没有现成的、但在途模拟器多于等待者时，登记为等待者并等其中一台开机完成：
+        剩余启动时间总短于再冷启动一个新模拟器，也避免与预热线程争抢 _boot_sem。
+        既无现成也无可分的在途模拟器（或分到的那台预热失败）时返回 None。
+        """
+        waiter = None
+        with self._warm_lock:
+            if self._warm_closed:
+                return None
+            if self._warm_ready:
+                item = self._warm_ready.popleft()
+            elif self._warm_inflight > len(self._warm_waiters):
+                waiter = Future()
+                self._warm_waiters.append(waiter)
+            else:
+                return None
+        if waiter is not None:
+            item = waiter.result()
+            if item is None:
+                return None
+        port, result = item
+        device_id = result['device_id']
+        self.active_emulators[trajectory_id] = EmulatorInfo(
+            device_id=device_id,
+            port=port,
+            process=result['process'],
+            snapshot_name=f'sandbox_{trajectory_id[:8]}',
+            status='running',
+            created_time=time.time(),
+        )
+        self._replenish_warm_pool()
+        return device_id
+
     def create(self) -> Dict[str, Any]:
-        """创建一个新的Android模拟器实例；若已存在空闲 emulator 则直接复用"""
+        """创建一个新的Android模拟器实例；优先领取预热池中的模拟器，其次复用已存在的空闲 emulator"""
         trajectory_id = str(uuid.uuid4())
 
+        device_id = self._claim_warm_emulator(trajectory_id)
+        if device_id is not None:
+            logger.info("领取预热模拟器 %s", device_id)
+            return {"success": True, "trajectory_id": trajectory_id, "device_id": device_id}
+
         # --------------------------------------------------------------
         # 0) 尝试复用已经存在且尚未被管理的 emulator
         # --------------------------------------------------------------
         existing = self._find_existing_emulator()
         if existing:
             device_id, console_port = existing
-            logger.info(f"复用已启动的 emulator {device_id} (console {console_port})")
-            self.active_emulators[trajectory_id] = {
-                "device_id": device_id,
-                "port": console_port,
-                "process": None,  # 无法取得外部进程句柄
-                "snapshot_name": f"sandbox_{trajectory_id[:8]}",
-                "status": "running",
-                "created_time": time.time(),
-            }
+            logger.info("复用已启动的 emulator %s (console %s)", device_id, console_port)
+            with self._port_lock:
+                self._used_ports.add(console_port)
+            self.active_emulators[trajectory_id] = EmulatorInfo(
+                device_id=device_id,
+                port=console_port,
+                process=None,  # 无法取得外部进程句柄
+                snapshot_name=f"sandbox_{trajectory_id[:8]}",
+                status="running",
+                created_time=time.time(),
+            )
             return {"success": True, "trajectory_id": trajectory_id, "device_id": device_id}
 
         # --------------------------------------------------------------
@@ -627,14 +1572,14 @@ class AndroidEnvironment(Environment):
             with self._port_lock:
                 port, adb_port = self._get_free_port_pair()  # port 为 console，adb_port 为 port+1
                 # 预先占位，防止其他线程选到同一端口
-                self.active_emulators[trajectory_id] = {
-                    'device_id': f'emulator-{adb_port}',  # 使用 adb 端口
-                    'port': port,
-                    'process': None,
-                    'snapshot_name': f'sandbox_{trajectory_id[:8]}',
-                    'status': 'starting',
-                    'created_time': time.time()
-                }
+                self._used_ports.add(port)
+                self.active_emulators[trajectory_id] = EmulatorInfo(
+                    device_id=f'emulator-{adb_port}',  # 使用 adb 端口
+                    port=port,
+                    snapshot_name=f'sandbox_{trajectory_id[:8]}',
+                    status='starting',
+                    created_time=time.time(),
+                )
             
             # 启动模拟器
             result = self._start_emulator(trajectory_id, port)
@@ -643,6 +1588,7 @@ class AndroidEnvironment(Environment):
                 # 若启动失败，清理占位条目
                 if trajectory_id in self.active_emulators:
                     self.active_emulators.pop(trajectory_id, None)
+                self._release_port(port)
                 return {
                     'success': False,
                     'error': result['error']
@@ -651,12 +1597,11 @@ class AndroidEnvironment(Environment):
             device_id = result['device_id']
             
             # 更新模拟器信息（先前已占位）
-            self.active_emulators[trajectory_id].update({
-                'device_id': device_id,
-                'process': result['process'],
-                'snapshot_name': result['snapshot_name'],
-                'status': 'running'
-            })
+            emulator_info = self.active_emulators[trajectory_id]
+            emulator_info.device_id = device_id
+            emulator_info.process = result['process']
+            emulator_info.snapshot_name = result['snapshot_name']
+            emulator_info.status = 'running'
             
             return {
                 'success': True,
@@ -666,14 +1611,26 @@ class AndroidEnvironment(Environment):
             
         except Exception as e:
             # 若启动失败，清理占位条目
-            if trajectory_id in self.active_emulators:
-                self.active_emulators.pop(trajectory_id, None)
-            logger.error(f"创建 Android 模拟器失败: {e}")
+            info = self.active_emulators.pop(trajectory_id, None)
+            if info is not None:
+                self._release_port(info.port)
+            logger.error("创建 Android 模拟器失败: %s", e)
             return {
                 'success': False,
                 'error': str(e)
             }
     
+    def create_batch(self, n: int) -> List[Dict[str, Any]]:
+        """并发创建 n 个模拟器实例，返回与逐个调用 create() 相同格式的结果列表
+
+        启动耗时主要在等待模拟器开机（I/O 等待），多线程即可把 n 次开机重叠起来；
+        端口分配由 _port_lock 保护，复用已有 emulator 时由 _try_claim_device 原子占用。
+        """
+        if n <= 0:
+            return []
+        with ThreadPoolExecutor(max_workers=n, thread_name_prefix='android-create') as pool:
+            return list(pool.map(lambda _: self.create(), range(n)))
+    
     def save(self, trajectory_id: str) -> Dict[str, Any]:
         """保存Android模拟器状态到快照"""
         if trajectory_id not in self.active_emulators:
@@ -684,27 +1641,27 @@ class AndroidEnvironment(Environment):
         
         try:
             emulator_info = self.active_emulators[trajectory_id]
-            device_id = emulator_info['device_id']
-            snapshot_name = emulator_info['snapshot_name']
+            device_id = emulator_info.device_id
+            snapshot_name = emulator_info.snapshot_name
             
-            logger.info(f"保存模拟器状态 {trajectory_id} 到快照 {snapshot_name}")
+            logger.info("保存模拟器状态 %s 到快照 %s", trajectory_id, snapshot_name)
             
             # 创建快照
             self._execute_adb_command(device_id, "emu", "avd", "snapshot", "save", snapshot_name)
             
             # 保存快照元数据
             snapshot_meta_path = os.path.join(self.snapshot_dir, f"{trajectory_id}.json")
-            with open(snapshot_meta_path, 'w') as f:
-                json.dump({
+            with open(snapshot_meta_path, 'wb') as f:
+                f.write(orjson.dumps({
                     'trajectory_id': trajectory_id,
                     'device_id': device_id,
-                    'port': emulator_info['port'],
+                    'port': emulator_info.port,
                     'snapshot_name': snapshot_name,
                     'timestamp': time.time()
-                }, f, indent=2)
+                }, option=orjson.OPT_INDENT_2))
             
-            emulator_info['snapshot_path'] = snapshot_meta_path
-            emulator_info['status'] = 'saved'
+            emulator_info.snapshot_path = snapshot_meta_path
+            emulator_info.status = 'saved'
             
             return {
                 'success': True,
@@ -712,7 +1669,7 @@ class AndroidEnvironment(Environment):
             }
             
         except Exception as e:
-            logger.error(f"保存 Android 模拟器状态失败: {e}")
+            logger.error("保存 Android 模拟器状态失败: %s", e)
             return {
                 'success': False,
                 'error': str(e)
@@ -729,75 +1686,35 @@ class AndroidEnvironment(Environment):
                 'error': f"找不到 trajectory_id 的快照: {trajectory_id}"
             }
         
+        reserved_port = None  # 本次新登记的端口，失败时需要释放
         try:
             # 如果模拟器已经在运行，先停止它
             if trajectory_id in self.active_emulators:
                 emulator_info = self.active_emulators[trajectory_id]
-                if emulator_info.get('status') == 'running':
-                    self._stop_emulator(emulator_info['device_id'])
+                if emulator_info.status == 'running':
+                    self._stop_emulator(emulator_info.device_id)
             
             # 加载快照元数据
-            with open(snapshot_meta_path, 'r') as f:
-                snapshot_data = json.load(f)
+            with open(snapshot_meta_path, 'rb') as f:
+                snapshot_data = orjson.loads(f.read())
             
             # 获取可用端口（如果需要新端口）
             if trajectory_id not in self.active_emulators:
-                port, adb_port = self._get_free_port_pair()
+                with self._port_lock:
+                    port, adb_port = self._get_free_port_pair()
+                    self._used_ports.add(port)
+                reserved_port = port
             else:
-                port = self.active_emulators[trajectory_id]['port']
+                port = self.active_emulators[trajectory_id].port
             
             # 启动模拟器，加载快照
             snapshot_name = snapshot_data['snapshot_name']
             
-            # 构建启动命令
-            cmd = [
-                self.emulator_path,
-                "-avd", self.avd_name,
-                "-port", str(port),
-                "-no-boot-anim",
-                "-no-audio",
-                "-no-window",
-                "-snapshot", snapshot_name,
-                "-snapshot-load"
-            ]
-            
-            # 启动模拟器进程
-            emulator_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            # 等待模拟器启动
+            # 启动模拟器进程并等待启动
             device_id = f"emulator-{port + 1}"
-            start_time = time.time()
-            device_ready = False
-            
-            while time.time() - start_time < self.boot_timeout:
-                try:
-                    result = subprocess.run(
-                        [self.adb_path, "devices"],
-                        check=True,
-                        capture_output=True,
-                        text=True
-                    )
-                    
-                    if device_id in result.stdout:
-                        boot_completed = subprocess.run(
-                            [self.adb_path, "-s", device_id, "shell", "getprop", "sys.boot_completed"],
-                            check=True,
-                            capture_output=True,
-                            text=True
-                        )
-                        
-                        if "1" in boot_completed.stdout:
-                            device_ready = True
-                            break
-                    
-                    time.sleep(2)
-                except Exception as e:
-                    logger.warning(f"等待模拟器启动时出错: {e}")
-                    time.sleep(2)
+            with self._boot_sem:
+                emulator_process = self._launch_emulator(trajectory_id, port, snapshot_name)
+                device_ready = self._wait_for_boot(device_id, self.boot_timeout)
             
             if not device_ready:
                 # 超时，终止模拟器进程
@@ -807,21 +1724,25 @@ class AndroidEnvironment(Environment):
                 except subprocess.TimeoutExpired:
                     emulator_process.kill()
                 
+                self._release_port(reserved_port)
                 return {
                     'success': False,
                     'error': f"从快照加载模拟器超时（{self.boot_timeout}秒）"
                 }
             
+            # 预取屏幕尺寸，后续动作与截图直接命中缓存
+            self._get_screen_size(device_id)
+            
             # 更新或创建模拟器信息
-            self.active_emulators[trajectory_id] = {
-                'device_id': device_id,
-                'port': port,
-                'process': emulator_process,
-                'snapshot_name': snapshot_name,
-                'status': 'running',
-                'snapshot_path': snapshot_meta_path,
-                'loaded_time': time.time()
-            }
+            self.active_emulators[trajectory_id] = EmulatorInfo(
+                device_id=device_id,
+                port=port,
+                process=emulator_process,
+                snapshot_name=snapshot_name,
+                status='running',
+                snapshot_path=snapshot_meta_path,
+                loaded_time=time.time(),
+            )
             
             return {
                 'success': True,
@@ -829,7 +1750,8 @@ class AndroidEnvironment(Environment):
             }
             
         except Exception as e:
-            logger.error(f"加载 Android 模拟器状态失败: {e}")
+            self._release_port(reserved_port)
+            logger.error("加载 Android 模拟器状态失败: %s", e)
             return {
                 'success': False,
                 'error': str(e)
@@ -839,11 +1761,7 @@ class AndroidEnvironment(Environment):
         """执行来自 android_world JSONAction 的动作并返回 observation 结果字典。"""
         try:
             action_type = ja.action_type
-            ### log info here
-            print('--------------------------------')
-            print('action_type:', action_type)
-            print('ja:', ja)
-            print('--------------------------------')
+            logger.debug("执行 JSONAction %s: %r", action_type, ja)
             obs: Dict[str, Any] = {"action": action_type}
 
             if action_type in {aw_json.CLICK, aw_json.DOUBLE_TAP, aw_json.LONG_PRESS}:
@@ -852,52 +1770,29 @@ class AndroidEnvironment(Environment):
                 x, y = int(ja.x), int(ja.y)
                 # DOUBLE_TAP/LONG_PRESS 仅通过两次 tap / 长按实现，简化处理
                 if action_type == aw_json.CLICK:
-                    self._execute_adb_command(device_id, "shell", "input", "tap", str(x), str(y))
+                    self._tap(device_id, x, y)
                 elif action_type == aw_json.DOUBLE_TAP:
-                    self._execute_adb_command(device_id, "shell", "input", "tap", str(x), str(y))
-                    time.sleep(0.05)
-                    self._execute_adb_command(device_id, "shell", "input", "tap", str(x), str(y))
+                    # 两次 tap 和间隔在同一次注入里完成
+                    self._tap(device_id, x, y, count=2)
                 else:  # LONG_PRESS
-                    self._execute_adb_command(device_id, "shell", "input", "swipe", str(x), str(y), str(x), str(y), "800")
+                    self._swipe(device_id, x, y, x, y, 800)
                 obs.update({"x": x, "y": y, "success": True})
 
             elif action_type == aw_json.INPUT_TEXT:
                 if ja.text is None:
                     raise ValueError("input_text 动作需要提供 text 字段")
                 text = ja.text
-                # shell input text 需要处理空格
-                safe_text = text.replace(" ", "%s")
-                self._execute_adb_command(device_id, "shell", "input", "text", safe_text)
+                self._execute_adb_shell_script(device_id, self._text_command(device_id, text))
                 obs.update({"text": text, "success": True})
 
-            elif action_type in {aw_json.NAVIGATE_BACK, aw_json.NAVIGATE_HOME, aw_json.KEYBOARD_ENTER}:
-                key_map = {
-                    aw_json.NAVIGATE_BACK: "KEYCODE_BACK",
-                    aw_json.NAVIGATE_HOME: "KEYCODE_HOME",
-                    aw_json.KEYBOARD_ENTER: "KEYCODE_ENTER",
-                }
-                key_code = key_map[action_type]
-                self._execute_adb_command(device_id, "shell", "input", "keyevent", key_code)
+            elif action_type in _JSON_ACTION_KEYS:
+                key_code = _JSON_ACTION_KEYS[action_type]
+                self._keyevent(device_id, key_code)
                 obs.update({"key": key_code, "success": True})
 
             elif action_type in {aw_json.SCROLL, aw_json.SWIPE}:
-                # 根据方向生成滑动坐标，使用屏幕中心或边缘
-                if ja.direction is None:
-                    raise ValueError("scroll/swipe 需要 direction 字段")
-                direction = ja.direction.lower()
-                screen_w, screen_h = self._get_screen_size(device_id) or (1080, 1920)
-                mid_x, mid_y = screen_w // 2, screen_h // 2
-                if direction == "down":
-                    x1, y1, x2, y2 = mid_x, int(screen_h * 0.25), mid_x, int(screen_h * 0.75)
-                elif direction == "up":
-                    x1, y1, x2, y2 = mid_x, int(screen_h * 0.75), mid_x, int(screen_h * 0.25)
-                elif direction == "left":
-                    x1, y1, x2, y2 = int(screen_w * 0.75), mid_y, int(screen_w * 0.25), mid_y
-                elif direction == "right":
-                    x1, y1, x2, y2 = int(screen_w * 0.25), mid_y, int(screen_w * 0.75), mid_y
-                else:
-                    raise ValueError(f"未知方向: {ja.direction}")
-                self._execute_adb_command(device_id, "shell", "input", "swipe", str(x1), str(y1), str(x2), str(y2), "300")
+                direction, (x1, y1, x2, y2) = self._direction_swipe(device_id, ja.direction)
+                self._swipe(device_id, x1, y1, x2, y2, 300)
                 obs.update({"direction": direction, "success": True})
 
             elif action_type == aw_json.OPEN_APP:
@@ -905,8 +1800,9 @@ class AndroidEnvironment(Environment):
                 if ja.app_name is None:
                     raise ValueError("open_app 需要 app_name")
 
-                activity: str | None = None
-                activity = aw_adb_utils.get_adb_activity(ja.app_name)
+                # 参数经常驻 shell 会话按一行命令执行，需要 shell 转义：
+                # 未配对的引号（如 "it's"）会让会话一直等待后续输入直到 shell_timeout
+                activity = _get_app_activity(ja.app_name)
                 if activity:
                     # 找到匹配 Activity，使用 am start -n
                     self._execute_adb_command(
@@ -915,7 +1811,7 @@ class AndroidEnvironment(Environment):
                         "am",
                         "start",
                         "-n",
-                        activity,
+                        shlex.quote(activity),
                     )
                 else:
                     # 回退：把 app_name 视为 package 名称，通过 monkey 简易启动
@@ -924,7 +1820,7 @@ class AndroidEnvironment(Environment):
                         "shell",
                         "monkey",
                         "-p",
-                        ja.app_name,
+                        shlex.quote(ja.app_name),
                         "1",
                     )
 
@@ -936,14 +1832,14 @@ class AndroidEnvironment(Environment):
             elif ja.keycode is not None:
                 # If a keycode is supplied, treat it as a single key event.
                 keycode = ja.keycode
-                self._execute_adb_command(device_id, "shell", "input", "keyevent", keycode)
+                self._keyevent(device_id, keycode)
                 obs.update({"keycode": keycode, "success": True})
 
             # ------------------------------------------------------------------
             # ANSWER – e.g. accept incoming phone call (KEYCODE_CALL)
             # ------------------------------------------------------------------
             elif action_type == aw_json.ANSWER:
-                self._execute_adb_command(device_id, "shell", "input", "keyevent", "KEYCODE_CALL")
+                self._keyevent(device_id, "KEYCODE_CALL")
                 obs.update({"success": True})
 
             elif action_type == aw_json.WAIT:
@@ -956,15 +1852,140 @@ class AndroidEnvironment(Environment):
 
             return {"success": True, "observation": obs}
         except Exception as e:
-            logger.error(f"执行 JSONAction 失败: {e}")
+            logger.error("执行 JSONAction 失败: %s", e)
             return {"success": False, "error": str(e)}
 
-    def step(self, trajectory_id: str, action: Any) -> Dict[str, Any]:
+    def _direction_swipe(self, device_id: str, direction: Optional[str]) -> Tuple[str, Tuple[int, int, int, int]]:
+        """根据方向生成滑动坐标，使用屏幕中心或边缘；返回 (小写方向, (x1, y1, x2, y2))"""
+        if direction is None:
+            raise ValueError("scroll/swipe 需要 direction 字段")
+        direction = direction.lower()
+        screen_w, screen_h = self._get_screen_size(device_id) or (1080, 1920)
+        mid_x, mid_y = screen_w // 2, screen_h // 2
+        if direction == "down":
+            return direction, (mid_x, int(screen_h * 0.25), mid_x, int(screen_h * 0.75))
+        if direction == "up":
+            return direction, (mid_x, int(screen_h * 0.75), mid_x, int(screen_h * 0.25))
+        if direction == "left":
+            return direction, (int(screen_w * 0.75), mid_y, int(screen_w * 0.25), mid_y)
+        if direction == "right":
+            return direction, (int(screen_w * 0.25), mid_y, int(screen_w * 0.75), mid_y)
+        raise ValueError(f"未知方向: {direction}")
+
+    def _json_action_shell(self, device_id: str, ja: aw_json.JSONAction) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """把纯输入类 JSONAction 转成等价的设备端 shell 命令，返回 (命令, observation 字段)
+
+        OPEN_APP / WAIT 等需要主机端逻辑的动作返回 None；缺少必要字段时抛 ValueError。
+        """
+        action_type = ja.action_type
+        if action_type in {aw_json.CLICK, aw_json.DOUBLE_TAP, aw_json.LONG_PRESS}:
+            if ja.x is None or ja.y is None:
+                raise ValueError("click/press 类动作需要提供 x、y 坐标")
+            x, y = int(ja.x), int(ja.y)
+            if action_type == aw_json.CLICK:
+                command = f"input tap {x} {y}"
+            elif action_type == aw_json.DOUBLE_TAP:
+                command = f"input tap {x} {y}; sleep 0.05; input tap {x} {y}"
+            else:  # LONG_PRESS
+                command = f"input swipe {x} {y} {x} {y} 800"
+            return command, {"x": x, "y": y}
+        if action_type == aw_json.INPUT_TEXT:
+            if ja.text is None:
+                raise ValueError("input_text 动作需要提供 text 字段")
+            return self._text_command(device_id, ja.text), {"text": ja.text}
+        if action_type in _JSON_ACTION_KEYS:
+            key_code = _JSON_ACTION_KEYS[action_type]
+            return f"input keyevent {key_code}", {"key": key_code}
+        if action_type in {aw_json.SCROLL, aw_json.SWIPE}:
+            direction, (x1, y1, x2, y2) = self._direction_swipe(device_id, ja.direction)
+            return f"input swipe {x1} {y1} {x2} {y2} 300", {"direction": direction}
+        if action_type == aw_json.OPEN_APP:
+            return None
+        if ja.keycode is not None:
+            return f"input keyevent {shlex.quote(str(ja.keycode))}", {"keycode": ja.keycode}
+        if action_type == aw_json.ANSWER:
+            return "input keyevent KEYCODE_CALL", {}
+        return None
+
+    def step_sequence(self, trajectory_id: str, actions: List[Any]) -> List[Dict[str, Any]]:
+        """按顺序执行同一 trajectory 的多个动作，返回与 actions 顺序一致的结果列表
+
+        连续的纯输入类动作（点击、滑动、输入、按键）拼成一段脚本，在一次 shell 调用中执行，
+        每条命令后输出退出码标记以判断各自成败；其余动作（打开应用、等待、截图等）逐个交给
+        step()。额外观察信息（activity / UI 层次结构）只在最后采集一次，附在最后一个结果上，
+        UI 层次结构与 step() 一样按 ui_stride 采样。input_injector='monkey' 时不合并，
+        每个动作都交给 step()，经 monkey 通道注入。
+        """
+        if trajectory_id not in self.active_emulators:
+            load_result = self.load(trajectory_id)
+            if not load_result.get("success", False):
+                return [load_result for _ in actions]
+        emulator_info = self.active_emulators[trajectory_id]
+        device_id = emulator_info.device_id
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(actions)
+        pending: List[Tuple[int, str, Dict[str, Any]]] = []  # (下标, shell 命令, observation)
+
+        def flush():
+            if not pending:
+                return
+            script = "; ".join(f"{command}; echo {_STEP_STATUS_MARKER}$?" for _, command, _ in pending)
+            try:
+                statuses = _STEP_STATUS_RE.findall(self._execute_adb_shell_script(device_id, script))
+            except Exception as e:
+                logger.error("批量执行动作失败: %s", e)
+                statuses = []
+            for n, (index, _, obs) in enumerate(pending):
+                if n < len(statuses) and statuses[n] == "0":
+                    obs["success"] = True
+                    emulator_info.step_count += 1
+                    results[index] = {"success": True, "observation": obs}
+                else:
+                    results[index] = {"success": False, "error": f"动作执行失败: {obs['action']}"}
+            pending.clear()
+
+        # 合并后的脚本固定用 input 命令注入；选了 monkey 通道时逐个交给 step()
+        batchable = self.input_injector != 'monkey'
+        compiled = None
+        for index, action in enumerate(actions):
+            try:
+                ja = to_json_action(action) if batchable else None
+            except Exception:  # noqa: BLE001 - 非 JSONAction（如 screenshot），交给 step()
+                ja = None
+            try:
+                compiled = self._json_action_shell(device_id, ja) if ja is not None else None
+            except ValueError as e:
+                results[index] = {"success": False, "error": str(e)}
+                continue
+            if compiled is None:
+                flush()
+                results[index] = self.step(trajectory_id, action)
+                continue
+            command, obs = compiled
+            pending.append((index, command, {"action": ja.action_type, **obs}))
+        flush()
+
+        if not actions:
+            return []
+        emulator_info.last_action = actions[-1]
+        emulator_info.last_action_time = time.monotonic_ns()
+        self._mark_awake(device_id)
+        # 最后一个动作由 step() 执行时已自带观察结果
+        last = results[-1]
+        if compiled is not None and last.get("success"):
+            include_ui = self.ui_stride > 0 and emulator_info.step_count % self.ui_stride == 0
+            last["observation"].update(self._get_extra_observation(device_id, include_ui))
+        return results
+
+    def step(self, trajectory_id: str, action: Any, include_ui: Optional[bool] = None) -> Dict[str, Any]:
         """在Android模拟器中执行动作
         
         兼容两种动作格式:
         1. 字符串命令 (click 100 200 等)
         2. JSONAction 字典 / JSON 字符串 (与 android_world.env.json_action 格式保持一致)
+
+        include_ui 控制文本命令的观察中是否包含 ui_elements；为空时 screenshot 动作总是包含，
+        其余动作按 ui_stride 决定。
         """
         try:
             # 若该 trajectory 对应的模拟器尚未激活，则尝试从快照加载
@@ -974,16 +1995,19 @@ class AndroidEnvironment(Environment):
                     return load_result
 
             emulator_info = self.active_emulators[trajectory_id]
-            device_id = emulator_info["device_id"]
+            device_id = emulator_info.device_id
 
             # --------------------------------------------------
             # 1) 优先尝试将动作解析为 JSONAction
             # --------------------------------------------------
             try:
                 ja = to_json_action(action)
-                return self._execute_json_action(device_id, ja)
+                result = self._execute_json_action(device_id, ja)
+                if result.get("success"):
+                    self._mark_awake(device_id)
+                return result
             except Exception as json_err:  # noqa: BLE001
-                logger.debug(f"to_json_action 解析失败，退回文本命令逻辑: {json_err}")
+                logger.debug("to_json_action 解析失败，退回文本命令逻辑: %s", json_err)
 
             # --------------------------------------------------
             # 2) 解析文本命令
@@ -996,97 +2020,101 @@ class AndroidEnvironment(Environment):
                 return {"success": False, "error": "空动作指令"}
 
             action_type = parts[0].lower()
-
-            # ---- click ----
-            if action_type == "click":
-                if len(parts) >= 3:
-                    x, y = int(parts[1]), int(parts[2])
-                    self._execute_adb_command(device_id, "shell", "input", "tap", str(x), str(y))
-                    observation = {"action": "click", "x": x, "y": y, "success": True}
-                else:
-                    return {"success": False, "error": "点击命令格式无效，应为: click <x> <y>"}
-
-            # ---- swipe ----
-            elif action_type == "swipe":
-                if len(parts) >= 5:
-                    x1, y1, x2, y2 = map(int, parts[1:5])
-                    duration = parts[5] if len(parts) > 5 else "300"  # 默认 300ms
-                    self._execute_adb_command(
-                        device_id, "shell", "input", "swipe",
-                        str(x1), str(y1), str(x2), str(y2), duration
-                    )
-                    observation = {
-                        "action": "swipe",
-                        "x1": x1, "y1": y1, "x2": x2, "y2": y2,
-                        "duration": duration, "success": True,
-                    }
-                else:
-                    return {"success": False, "error": "滑动命令格式无效，应为: swipe <x1> <y1> <x2> <y2> [duration]"}
-
-            # ---- text ----
-            elif action_type == "text":
-                text = " ".join(parts[1:])
-                if text.startswith('"') and text.endswith('"'):
-                    text = text[1:-1]
-                safe_text = text.replace(" ", "%s")
-                self._execute_adb_command(device_id, "shell", "input", "text", safe_text)
-                observation = {"action": "text", "text": text, "success": True}
-
-            # ---- key ----
-            elif action_type == "key":
-                if len(parts) >= 2:
-                    key = parts[1].lower()
-                    key_code = self._get_key_code(key)
-                    self._execute_adb_command(device_id, "shell", "input", "keyevent", key_code)
-                    observation = {"action": "key", "key": key, "success": True}
-                else:
-                    return {"success": False, "error": "按键命令格式无效，应为: key <key_name>"}
-
-            # ---- screenshot ----
-            elif action_type == "screenshot":
-                screenshot_data = self._take_screenshot(device_id)
-                observation = {"action": "screenshot", "image": screenshot_data, "success": True}
-
-            else:
+            handler = self._action_handlers.get(action_type)
+            if handler is None:
                 return {"success": False, "error": f"未知的动作类型: {action_type}"}
+            try:
+                observation = handler(device_id, parts)
+            except _ActionFormatError as e:
+                return {"success": False, "error": str(e)}
+            want_screenshot = action_type == "screenshot"
 
             # --------------------------------------------------
             # 更新模拟器状态 & 额外观察信息
             # --------------------------------------------------
-            emulator_info["last_action"] = action
-            emulator_info["last_action_time"] = time.time()
-            observation.update(self._get_extra_observation(device_id))
+            emulator_info.last_action = action
+            emulator_info.last_action_time = time.monotonic_ns()
+            emulator_info.step_count += 1
+            if include_ui is None:
+                include_ui = want_screenshot or (
+                    self.ui_stride > 0 and emulator_info.step_count % self.ui_stride == 0
+                )
+            if not want_screenshot:
+                # 点击 / 滑动 / 输入 / 按键都会让屏幕保持亮起
+                self._mark_awake(device_id)
+            observation.update(
+                self._observe(device_id, emulator_info, screenshot=want_screenshot, include_ui=include_ui)
+            )
 
             return {"success": True, "observation": observation}
 
         except Exception as e:  # noqa: BLE001
-            logger.error(f"在 Android 模拟器中执行动作失败: {e}")
+            logger.error("在 Android 模拟器中执行动作失败: %s", e)
             return {"success": False, "error": str(e)}
     
-    def _get_key_code(self, key: str) -> str:
-        """将关键字转换为 Android 键代码"""
-        key_mapping = {
-            'back': 'KEYCODE_BACK',
-            'home': 'KEYCODE_HOME',
-            'menu': 'KEYCODE_MENU',
-            'power': 'KEYCODE_POWER',
-            'enter': 'KEYCODE_ENTER',
-            'delete': 'KEYCODE_DEL',
-            'recents': 'KEYCODE_APP_SWITCH',
-            'volume_up': 'KEYCODE_VOLUME_UP',
-            'volume_down': 'KEYCODE_VOLUME_DOWN'
+    # ---- 文本命令处理函数：(device_id, parts) -> observation，格式错误时抛 _ActionFormatError ----
+    def _do_click(self, device_id: str, parts: List[str]) -> Dict[str, Any]:
+        if len(parts) < 3:
+            raise _ActionFormatError("点击命令格式无效，应为: click <x> <y>")
+        x, y = int(parts[1]), int(parts[2])
+        self._tap(device_id, x, y)
+        return {"action": "click", "x": x, "y": y, "success": True}
+
+    def _do_swipe(self, device_id: str, parts: List[str]) -> Dict[str, Any]:
+        if len(parts) < 5:
+            raise _ActionFormatError("滑动命令格式无效，应为: swipe <x1> <y1> <x2> <y2> [duration]")
+        x1, y1, x2, y2 = map(int, parts[1:5])
+        duration = int(parts[5]) if len(parts) > 5 else 300  # 默认 300ms
+        self._swipe(device_id, x1, y1, x2, y2, duration)
+        return {
+            "action": "swipe",
+            "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+            "duration": duration, "success": True,
         }
-        
-        return key_mapping.get(key.lower(), key)
+
+    def _do_text(self, device_id: str, parts: List[str]) -> Dict[str, Any]:
+        text = " ".join(parts[1:])
+        if text.startswith('"') and text.endswith('"'):
+            text = text[1:-1]
+        self._execute_adb_shell_script(device_id, self._text_command(device_id, text))
+        return {"action": "text", "text": text, "success": True}
+
+    def _do_key(self, device_id: str, parts: List[str]) -> Dict[str, Any]:
+        if len(parts) < 2:
+            raise _ActionFormatError("按键命令格式无效，应为: key <key_name>")
+        key = parts[1].lower()
+        self._keyevent(device_id, self._get_key_code(key))
+        return {"action": "key", "key": key, "success": True}
+
+    def _do_screenshot(self, device_id: str, parts: List[str]) -> Dict[str, Any]:
+        # 截图本身在 _observe 中采集
+        return {"action": "screenshot", "image": None, "success": True}
+
+    def _get_key_code(self, key: str) -> str:
+        """将关键字转换为 Android 键代码
+
+        未在 _KEY_MAPPING 中的名称规范化为 KEYCODE_<NAME>（如 a → KEYCODE_A），
+        数字键值原样返回；`input keyevent` 不接受小写的裸名称。
+        """
+        k = key.lower()
+        code = _KEY_MAPPING.get(k)
+        if code is not None:
+            return code
+        if k.isdigit():
+            return k
+        return k.upper() if k.startswith('keycode_') else f"KEYCODE_{k.upper()}"
     
     def remove(self, trajectory_id: str) -> Dict[str, Any]:
         """删除Android模拟器实例和快照"""
-        # 首先检查快照文件
-        snapshot_meta_path = os.path.join(self.snapshot_dir, f"{trajectory_id}.json")
-        snapshot_exists = os.path.exists(snapshot_meta_path)
-        
-        # 检查激活的模拟器
-        emulator_active = trajectory_id in self.active_emulators
+        # 检查激活的模拟器；其快照元数据路径在 save() / load() 时已记录，为空说明没有元数据文件，无需再 stat
+        emulator_info = self.active_emulators.get(trajectory_id)
+        emulator_active = emulator_info is not None
+        if emulator_active:
+            snapshot_meta_path = emulator_info.snapshot_path
+            snapshot_exists = snapshot_meta_path is not None
+        else:
+            snapshot_meta_path = os.path.join(self.snapshot_dir, f"{trajectory_id}.json")
+            snapshot_exists = os.path.exists(snapshot_meta_path)
         
         if not snapshot_exists and not emulator_active:
             return {'success': False, 'error': f"未知的 trajectory_id: {trajectory_id}"}
@@ -1094,46 +2122,45 @@ class AndroidEnvironment(Environment):
         try:
             # 如果模拟器在运行，停止它
             if emulator_active:
-                emulator_info = self.active_emulators[trajectory_id]
-                device_id = emulator_info['device_id']
+                device_id = emulator_info.device_id
                 
-                logger.info(f"移除模拟器实例和快照 {trajectory_id}")
+                logger.info("移除模拟器实例和快照 %s", trajectory_id)
                 
-                # 停止模拟器
-                if emulator_info['status'] == 'running':
+                # 停止模拟器（_stop_emulator 会一并清理设备状态）；未运行时只清理设备状态
+                if emulator_info.status == 'running':
                     self._stop_emulator(device_id)
+                else:
+                    self._forget_device(device_id)
                 # 释放跨进程锁
                 self._release_claim(device_id)
                 
                 # 如果有进程引用，尝试终止
-                if 'process' in emulator_info and emulator_info['process']:
+                if emulator_info.process:
                     try:
-                        emulator_info['process'].terminate()
-                        emulator_info['process'].wait(timeout=5)
+                        emulator_info.process.terminate()
+                        emulator_info.process.wait(timeout=5)
                     except:
                         # 如果无法正常终止，强制终止
                         try:
-                            emulator_info['process'].kill()
+                            emulator_info.process.kill()
                         except:
                             pass
                 
                 # 从激活模拟器列表中删除
                 del self.active_emulators[trajectory_id]
+                self._release_port(emulator_info.port)
             
             # 删除快照文件
             if snapshot_exists:
-                # 读取快照元数据以获取快照名称
+                # 实际上，我们不能通过 ADB 直接删除模拟器快照
+                # 在生产环境中，可能需要使用 Android Studio 或特定 API 删除快照
+                # 这里只删除元数据文件
                 try:
-                    with open(snapshot_meta_path, 'r') as f:
-                        meta_data = json.load(f)
-                        snapshot_name = meta_data.get('snapshot_name')
-                        
-                    # 实际上，我们不能通过 ADB 直接删除模拟器快照
-                    # 在生产环境中，可能需要使用 Android Studio 或特定 API 删除快照
-                    # 这里只删除元数据文件
                     os.remove(snapshot_meta_path)
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
-                    logger.warning(f"删除快照元数据时出错: {e}")
+                    logger.warning("删除快照元数据时出错: %s", e)
             
             return {
                 'success': True,
@@ -1141,34 +2168,112 @@ class AndroidEnvironment(Environment):
             }
             
         except Exception as e:
-            logger.error(f"删除 Android 模拟器失败: {e}")
+            logger.error("删除 Android 模拟器失败: %s", e)
             return {
                 'success': False,
                 'error': str(e)
             }
     
-    def _get_extra_observation(self, device_id: str) -> Dict[str, Any]:
-        """获取额外的观察信息"""
+    def remove_batch(self, trajectory_ids: List[str]) -> List[Dict[str, Any]]:
+        """并发移除多个模拟器实例，结果顺序与 trajectory_ids 一致"""
+        if not trajectory_ids:
+            return []
+        with ThreadPoolExecutor(max_workers=len(trajectory_ids), thread_name_prefix='android-remove') as pool:
+            return list(pool.map(self.remove, trajectory_ids))
+    
+    def _observe(self, device_id: str, emulator_info: EmulatorInfo, screenshot: bool = True,
+                 include_ui: bool = True) -> Dict[str, Any]:
+        """采集一次观察：截图（可选）与 activity / 屏幕尺寸 / UI 层次结构（可选）
+
+        截图走 exec-out、其余走 shell 脚本，互不依赖；截图提交到 _obs_pool，与当前线程中的
+        额外观察并行，耗时取两者较大值而非相加。
+        """
+        future = (
+            self._obs_pool.submit(self._screenshot_observation, device_id, emulator_info)
+            if screenshot else None
+        )
+        result = self._get_extra_observation(device_id, include_ui)
+        if future is not None:
+            result.update(future.result())
+        return result
+
+    def close(self):
+        """释放后台资源：观察线程池、所有常驻 adb shell 会话，并停止尚未领取的预热模拟器
+
+        已分配给 trajectory 的模拟器不在此停止，由 remove() 负责。
+        """
+        self._obs_pool.shutdown(wait=False)
+        # 之后开机完成的预热模拟器由 _warm_done 自行停止，等待中的重试不再触发
+        with self._warm_lock:
+            self._warm_closed = True
+            ready, self._warm_ready = list(self._warm_ready), deque()
+            waiters, self._warm_waiters = list(self._warm_waiters), deque()
+            timers, self._warm_timers = self._warm_timers, set()
+        for timer in timers:
+            timer.cancel()
+        for waiter in waiters:
+            waiter.set_result(None)
+        for port, result in ready:
+            self._stop_emulator(result['device_id'])
+            self._release_port(port)
+        with self._shells_lock:
+            device_ids = set(self._shells) | set(self._injectors)
+        for device_id in device_ids:
+            self._close_shell(device_id)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _get_extra_observation(self, device_id: str, include_ui: bool = True) -> Dict[str, Any]:
+        """获取额外的观察信息
+
+        当前活动、屏幕尺寸（未缓存时）和 UI 层次结构（include_ui 时）在同一次 `adb shell` 中取回，
+        各段之间用 _OBS_SEPARATOR 分隔，省去多次 adb 进程启动和传输握手。
+        """
         result = {}
         
         try:
+            screen_size = self._screen_size_cache.get(device_id)
+            stream_ui = include_ui and device_id not in self._ui_dump_via_file
+            script = (
+                f"{_FOCUS_LINES_CMD}; "
+                f"echo {_OBS_SEPARATOR}; "
+                f"{'' if screen_size else 'wm size; '}"
+                f"echo {_OBS_SEPARATOR}"
+                f"{'; ' + self._ui_dump_stream_cmd if stream_ui else ''}"
+            )
+            # 输出保持为 bytes：只解码很短的 activity / size 两段，UI XML 原样交给解析器
+            output = self._execute_adb_shell_script(device_id, script, text=False)
+            activity_out, size_out, ui_out = output.split(_OBS_SEPARATOR.encode(), 2)
+            activity_out = activity_out.decode('utf-8', errors='replace')
+            size_out = size_out.decode('utf-8', errors='replace')
+            
             # 获取当前活动
-            current_activity = self._get_current_activity(device_id)
+            current_activity = self._parse_focused_activity(activity_out)
             if current_activity:
                 result['current_activity'] = current_activity
             
             # 获取屏幕尺寸
-            screen_size = self._get_screen_size(device_id)
+            if screen_size is None:
+                match = _WM_SIZE_RE.search(size_out)
+                if match:
+                    screen_size = (int(match.group(1)), int(match.group(2)))
+                    self._screen_size_cache[device_id] = screen_size
             if screen_size:
                 result['screen_size'] = screen_size
             
-            # 获取 UI 层次结构
-            ui_xml = self._dump_ui_hierarchy(device_id)
+            if not include_ui:
+                return result
+            
+            # 获取 UI 层次结构；流式 dump 不可用时退回临时文件方式
+            ui_xml = self._resolve_ui_dump(device_id, ui_out if stream_ui else None)
             if ui_xml:
-                ui_elements = self._parse_ui_elements(ui_xml)
-                result['ui_elements'] = ui_elements
+                result['ui_elements'] = self._cached_ui_elements(device_id, ui_xml)
         except Exception as e:
-            logger.error(f"获取额外观察信息失败: {e}")
+            logger.error("获取额外观察信息失败: %s", e)
         
         return result
 
@@ -1189,16 +2294,16 @@ class AndroidEnvironment(Environment):
             pass  # load failed, so snapshot likely missing – we'll create below
         try:
             self._execute_adb_command(device_id, "emu", "avd", "snapshot", "save", self._BASELINE_SNAPSHOT)
-            logger.info(f"Baseline snapshot '{self._BASELINE_SNAPSHOT}' created for {device_id}")
+            logger.info("Baseline snapshot '%s' created for %s", self._BASELINE_SNAPSHOT, device_id)
         except Exception as e:
-            logger.warning(f"无法创建 baseline snapshot: {e}")
+            logger.warning("无法创建 baseline snapshot: %s", e)
 
     def reset(self, trajectory_id: str) -> Dict[str, Any]:
         """Fast-reset emulator to the baseline snapshot; fallback to HOME+clear if snapshot missing."""
         if trajectory_id not in self.active_emulators:
             return {"success": False, "error": f"未知的 trajectory_id: {trajectory_id}"}
         emulator_info = self.active_emulators[trajectory_id]
-        device_id = emulator_info["device_id"]
+        device_id = emulator_info.device_id
         try:
             # 尝试加载 baseline snapshot
             load_ok = False
@@ -1210,13 +2315,14 @@ class AndroidEnvironment(Environment):
                 load_ok = False
             if not load_ok:
                 # Snapshot 不存在 – 退化为模拟按 HOME & 清后台
-                logger.info(f"baseline snapshot 不存在，使用按键方式重置 {device_id}")
-                self._execute_adb_command(device_id, "shell", "input", "keyevent", "KEYCODE_HOME")
-                # 清理最近应用，可能需要 root；这里简单按两次最近任务
-                self._execute_adb_command(device_id, "shell", "input", "keyevent", "KEYCODE_APP_SWITCH")
-                time.sleep(0.2)
-                self._execute_adb_command(device_id, "shell", "input", "keyevent", "KEYCODE_HOME")
+                logger.info("baseline snapshot 不存在，使用按键方式重置 %s", device_id)
+                # 清理最近应用，可能需要 root；这里简单按两次最近任务。三次按键和间隔在一次 shell 调用中完成
+                self._execute_adb_shell_script(
+                    device_id,
+                    "input keyevent KEYCODE_HOME; input keyevent KEYCODE_APP_SWITCH; "
+                    "sleep 0.2; input keyevent KEYCODE_HOME",
+                )
             return {"success": True}
         except Exception as e:
-            logger.error(f"reset 失败: {e}")
+            logger.error("reset 失败: %s", e)
             return {"success": False, "error": str(e)}
@@ -1,5 +1,5 @@
 import uuid
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from utils.logging import setup_logger
 
 logger = setup_logger()
@@ -20,6 +20,13 @@ class Environment:
         """
         raise NotImplementedError("Subclasses must implement create()")
     
+    def create_batch(self, n: int) -> List[Dict[str, Any]]:
+        """
+        创建 n 个环境实例，默认逐个调用 create()；启动耗时较长的子类可并发实现
+        返回：每个实例的创建结果列表
+        """
+        return [self.create() for _ in range(n)]
+    
     def save(self, trajectory_id: str) -> Dict[str, Any]:
         """
         保存环境状态到对象存储中
@@ -46,6 +53,16 @@ class Environment:
         """
         raise NotImplementedError("Subclasses must implement step()")
     
+    def step_sequence(self, trajectory_id: str, actions: List[Any]) -> List[Dict[str, Any]]:
+        """
+        在同一环境中按顺序执行多个动作，默认逐个调用 step()；每步开销较大的子类可合并执行
+        参数：
+            trajectory_id - 轨迹ID
+            actions - 要执行的动作列表
+        返回：与 actions 顺序一致的执行结果列表
+        """
+        return [self.step(trajectory_id, action) for action in actions]
+    
     def remove(self, trajectory_id: str) -> Dict[str, Any]:
         """
         从对象存储中删除环境状态
@@ -53,3 +70,11 @@ class Environment:
         返回：操作状态
         """
         raise NotImplementedError("Subclasses must implement remove()")
+    
+    def remove_batch(self, trajectory_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        删除多个环境实例，默认逐个调用 remove()
+        参数：trajectory_ids - 轨迹ID列表
+        返回：与 trajectory_ids 顺序一致的操作状态列表
+        """
+        return [self.remove(trajectory_id) for trajectory_id in trajectory_ids]
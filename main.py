@@ -29,6 +29,36 @@ def handle_signal(signum, frame):
     logger.info(f"收到信号 {signum}，正在退出...")
     sys.exit(0)
 
+def build_api_coordinator(config, env_type='android'):
+    """创建 Coordinator，注册并启动 API 模式所需的环境 Worker 和 Reward Worker
+
+    main.py 的 api 模式和 asgi.py 共用；环境类型不支持时返回 None。
+    """
+    coordinator = Coordinator(config)
+    
+    if env_type == 'android':
+        # 使用配置中的 Android 环境参数（如果存在）
+        android_config = config.get('environment', {}).get('android', {})
+        env = AndroidEnvironment(android_config)
+    elif env_type in ('android_world', 'aw'):
+        from environment.android_world_wrapper import AndroidWorldAsyncEnvironment
+        aw_config = config.get('environment', {}).get('android_world', {})
+        env = AndroidWorldAsyncEnvironment(aw_config)
+    else:
+        logger.error(f"不支持的环境类型: {env_type}")
+        return None
+    
+    env_worker = EnvironmentWorker(config, env)
+    reward_worker = RewardWorker(config)
+    
+    coordinator.register_worker(env_worker)
+    coordinator.register_worker(reward_worker)
+    
+    # 启动 Worker
+    coordinator.start_worker(env_worker.id)
+    coordinator.start_worker(reward_worker.id)
+    return coordinator
+
 def main():
     # 注册信号处理
     signal.signal(signal.SIGINT, handle_signal)
@@ -78,32 +108,11 @@ def main():
         except KeyboardInterrupt:
             worker.stop()
     elif args.mode == 'api':
-        # 创建协调器和API服务器
-        coordinator = Coordinator(config)
-        
-        # 注册必要的 Worker
-        if args.env_type == 'android':
-            # 使用配置中的 Android 环境参数（如果存在）
-            android_config = config.get('environment', {}).get('android', {})
-            env = AndroidEnvironment(android_config)
-        elif args.env_type in ('android_world', 'aw'):
-            from environment.android_world_wrapper import AndroidWorldAsyncEnvironment
-            aw_config = config.get('environment', {}).get('android_world', {})
-            env = AndroidWorldAsyncEnvironment(aw_config)
-        else:
-            logger.error(f"不支持的环境类型: {args.env_type}")
+        # 创建协调器并注册必要的 Worker
+        coordinator = build_api_coordinator(config, args.env_type)
+        if coordinator is None:
             return
         
-        env_worker = EnvironmentWorker(config, env)
-        reward_worker = RewardWorker(config)
-        
-        coordinator.register_worker(env_worker)
-        coordinator.register_worker(reward_worker)
-        
-        # 启动 Worker
-        coordinator.start_worker(env_worker.id)
-        coordinator.start_worker(reward_worker.id)
-        
         # 启动API服务器
         api_server = ApiServer(
             coordinator, 
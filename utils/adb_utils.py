@@ -7,6 +7,12 @@ from utils.logging import setup_logger
 
 logger = setup_logger()
 
+# `wm size` 输出形如 "Physical size: 1080x1920"
+_WM_SIZE_RE = re.compile(r"(\d+)x(\d+)")
+# dumpsys window 的焦点窗口行 / dumpsys activity 的 resumed activity 行
+_FOCUS_RE = re.compile(r"mCurrentFocus=.*?{.*\s+([\w\.]+/[\w\.]+)}")
+_RESUMED_ACTIVITY_RE = re.compile(r"mResumedActivity:.*?(\S+/\S+)")
+
 class ADBUtils:
     """ADB 工具类，提供与 Android 设备交互的实用工具"""
     
@@ -131,7 +137,7 @@ class ADBUtils:
             result = self.execute(device_id, "shell", "wm", "size")
             
             # 解析输出，格式通常是 "Physical size: 1080x1920"
-            match = re.search(r"(\d+)x(\d+)", result.stdout)
+            match = _WM_SIZE_RE.search(result.stdout)
             if match:
                 width = int(match.group(1))
                 height = int(match.group(2))
@@ -150,13 +156,13 @@ class ADBUtils:
             )
             
             # 解析输出寻找活动名称
-            match = re.search(r"mCurrentFocus=.*?{.*\s+([\w\.]+/[\w\.]+)}", result.stdout)
+            match = _FOCUS_RE.search(result.stdout)
             if match:
                 return match.group(1)
                 
             # 备用方法：使用 dumpsys activity
             result = self.execute(device_id, "shell", "dumpsys", "activity", "activities", "|", "grep", "mResumedActivity")
-            match = re.search(r"mResumedActivity:.*?(\S+/\S+)", result.stdout)
+            match = _RESUMED_ACTIVITY_RE.search(result.stdout)
             if match:
                 return match.group(1)
         except Exception as e:
@@ -1,5 +1,5 @@
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from worker.base import Worker
 from environment.base import Environment
 from utils.logging import setup_logger
@@ -63,6 +63,29 @@ class EnvironmentWorker(Worker):
                     trajectory_id = result['trajectory_id']
                     self.active_trajectories[trajectory_id] = time.time()
                 return result
+
+            if action == 'create_batch':
+                # 并发创建多个环境，results 与创建顺序一一对应
+                n = request.get('n')
+                if not isinstance(n, int) or isinstance(n, bool) or n < 1:
+                    return {'success': False, 'error': 'n must be a positive integer'}
+                results = self.environment.create_batch(n)
+                now = time.time()
+                for result in results:
+                    if result.get('success'):
+                        self.active_trajectories[result['trajectory_id']] = now
+                return {'success': all(r.get('success') for r in results), 'results': results}
+
+            if action == 'remove_batch':
+                # 并发删除多个环境，results 与 trajectory_ids 顺序一致
+                trajectory_ids = request.get('trajectory_ids')
+                if not isinstance(trajectory_ids, list) or not trajectory_ids:
+                    return {'success': False, 'error': 'Missing trajectory_ids'}
+                results = self.environment.remove_batch(trajectory_ids)
+                for removed_id, result in zip(trajectory_ids, results):
+                    if result.get('success'):
+                        self.active_trajectories.pop(removed_id, None)
+                return {'success': all(r.get('success') for r in results), 'results': results}
                 
             if not trajectory_id:
                 return {'success': False, 'error': 'Missing trajectory_id'}
@@ -87,7 +110,14 @@ class EnvironmentWorker(Worker):
                 command = request.get('command')
                 if not command:
                     return {'success': False, 'error': 'Missing command for step action'}
-                return self.environment.step(trajectory_id, command)
+                result = self.environment.step(trajectory_id, command)
+                return self._strip_inline_image(request, result)
+                
+            elif action == 'screenshot':
+                # 返回原始 PNG 字节（仅支持提供 get_screenshot 的环境）
+                if not hasattr(self.environment, 'get_screenshot'):
+                    return {'success': False, 'error': 'Screenshot not supported by environment'}
+                return self.environment.get_screenshot(trajectory_id, cached=bool(request.get('cached')))
                 
             elif action == 'remove':
                 # 删除环境
@@ -102,3 +132,51 @@ class EnvironmentWorker(Worker):
         except Exception as e:
             logger.error(f"Error handling request {action} for trajectory {trajectory_id}: {e}")
             return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def _strip_inline_image(request: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """inline_image=false 时客户端改用 /api/env/screenshot/<trajectory_id> 取图，这里只保留 ETag"""
+        if request.get('inline_image') is False:
+            observation = result.get('observation')
+            if isinstance(observation, dict):
+                observation.pop('image', None)
+        return result
+
+    def _handle_step_sequence(self, requests: List[Any]) -> Optional[List[Dict[str, Any]]]:
+        """同一 trajectory 的一批 step 交给 environment.step_sequence 合并执行
+
+        只有全部是带 command 的 step 且 trajectory_id 相同时才合并，否则返回 None，由调用方逐条处理。
+        """
+        if len(requests) < 2 or not isinstance(requests[0], dict):
+            return None
+        trajectory_id = requests[0].get('trajectory_id')
+        if not trajectory_id or not all(
+            isinstance(r, dict) and r.get('action') == 'step'
+            and r.get('trajectory_id') == trajectory_id and r.get('command')
+            for r in requests
+        ):
+            return None
+        if trajectory_id in self.active_trajectories:
+            self.active_trajectories[trajectory_id] = time.time()
+        try:
+            results = self.environment.step_sequence(trajectory_id, [r['command'] for r in requests])
+        except Exception as e:
+            logger.error(f"Error handling step sequence for trajectory {trajectory_id}: {e}")
+            return [{'success': False, 'error': str(e)} for _ in requests]
+        return [self._strip_inline_image(r, result) for r, result in zip(requests, results)]
+
+    def handle_batch_request(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按顺序处理一批请求，结果与输入一一对应；单条失败不影响其余请求
+
+        同一 trajectory 的连续 step 经 environment.step_sequence 合并执行。
+        """
+        sequence_results = self._handle_step_sequence(requests)
+        if sequence_results is not None:
+            return sequence_results
+        results = []
+        for request in requests:
+            if not isinstance(request, dict):
+                results.append({'success': False, 'error': 'Request must be an object'})
+                continue
+            results.append(self.handle_request(request))
+        return results
@@ -96,7 +96,7 @@ class RewardWorker(Worker):
                 # 检查缓存
                 cache_key = f"{trajectory_id}:{reward_type}"
                 if cache_key in self.cache:
-                    logger.info(f"Cache hit for reward calculation {cache_key}")
+                    logger.debug("Cache hit for reward calculation %s", cache_key)
                     return self.cache[cache_key]['result']
                 
                 # 计算奖励